@@ -0,0 +1,479 @@
+"""
+The Streamlit exam script analyzer, shared by the Gemini (app.py) and
+Groq (groq_back.py) apps. Each of them configures its model backend and
+calls run_app; everything else, from the upload form to the background
+jobs panel, lives here.
+"""
+import streamlit as st
+import os
+import json
+from pdf_pages import count_pdf_pages, profile_report, ENCODE_PROFILES, DEFAULT_PROFILE
+from ocr_pool import DEFAULT_MAX_WORKERS
+from sheets import open_worksheet, ensure_header_row, SheetWriter, SheetIndex
+from ocr_cache import OcrCache
+from journal import JobJournal
+from rate_limit import RateLimiter, PROVIDER_LIMITS
+from metrics import RunMetrics
+from result_store import ResultStore, StoreWriter, SheetSync
+from job_queue import JobQueue, WorkerPool, QUEUED, RUNNING, FAILED
+from pipeline import analyze_pdf, write_page, PageSkipped, response_format_report, DEFAULT_BATCH_SIZE, RESPONSE_FORMATS, DEFAULT_RESPONSE_FORMAT
+
+# --- Configuration ---
+
+# Used when the SERVICE_ACCOUNT_JSON_STR secret isn't set (local development)
+SERVICE_ACCOUNT_FILE = "service_account.json"
+
+# Environment variable holding each provider's API key, as make_backend reads it
+API_KEY_NAMES = {"gemini": "GOOGLE_API_KEY", "groq": "GROQ_API_KEY"}
+
+# Seconds between refreshes of the background jobs panel
+JOB_POLL_SECONDS = 2
+
+# Streamlit reruns the app script on every interaction. Clients, connections and
+# the databases below are created on first use and cached with
+# st.cache_resource, so they are shared by every rerun and every session.
+
+# --- Model ---
+
+def get_backend(get_provider_backend, label, api_key_name):
+    """
+    Returns the app's cached model backend. If it can't be configured,
+    shows the error and stops this run of the script.
+    """
+    try:
+        return get_provider_backend()
+    except Exception as e:
+        st.error(f"Could not configure {label}. Is {api_key_name} set? Error: {e}")
+        st.stop()
+
+# --- OCR Cache ---
+
+@st.cache_resource
+def get_ocr_cache():
+    """
+    Opens the on-disk OCR result cache once per process.
+    """
+    return OcrCache()
+
+@st.cache_resource
+def get_journal():
+    """
+    Opens the job journal once per process. It records every page's
+    progress so an interrupted run resumes where it stopped.
+    """
+    return JobJournal()
+
+# --- PDF Processing Function ---
+
+def count_uploaded_pages(uploaded_file):
+    """
+    Returns the number of pages in the uploaded PDF, or 0 if it can't be read.
+    The pages themselves are rendered and analyzed by pipeline.analyze_pdf.
+    """
+    try:
+        return count_pdf_pages(uploaded_file.getvalue())
+    except Exception as e:
+        st.error(f"PDF Conversion Error: {e}")
+        st.info("This app needs the 'Poppler' library on your system (see packages.txt for deployment).")
+        return 0
+
+# --- Google Sheets Functions ---
+
+def get_service_account():
+    """
+    The service account as open_worksheet arguments: from secrets when
+    running in Streamlit cloud, else the local file (for local development).
+    """
+    if "SERVICE_ACCOUNT_JSON_STR" in st.secrets:
+        return {"service_account_info": json.loads(st.secrets["SERVICE_ACCOUNT_JSON_STR"])}
+    return {"service_account_file": SERVICE_ACCOUNT_FILE}
+
+@st.cache_resource
+def get_worksheet(sheet_id):
+    """
+    Opens the worksheet once per process and reuses the same
+    authenticated client (and its HTTP connections) for every run.
+    """
+    worksheet = open_worksheet(sheet_id, **get_service_account())
+    # Check if the header row exists or is empty, and create if necessary
+    if ensure_header_row(worksheet):
+        st.info("Created new header row in Google Sheet.")
+    return worksheet
+
+@st.cache_resource
+def get_sheets_limiter():
+    """
+    One Sheets rate limiter for every session, since they share the
+    service account's quota.
+    """
+    return RateLimiter(name="sheets", **PROVIDER_LIMITS["sheets"])
+
+def get_sheet_index(sheet_id):
+    """
+    Reads the whole sheet once per session and indexes its rows by
+    Application_No and Image Name. The writer keeps it up to date.
+    """
+    if "sheet_index" not in st.session_state:
+        st.session_state["sheet_index"] = SheetIndex.load(get_worksheet(sheet_id))
+    return st.session_state["sheet_index"]
+
+@st.cache_resource
+def get_result_store():
+    """
+    Opens the local result store once per process.
+    """
+    return ResultStore()
+
+@st.cache_resource
+def get_sheet_sync(sheet_id, upsert=False):
+    """
+    Starts the background task that mirrors the local result store
+    to Google Sheets, once per process and upsert mode so rows are
+    never synced twice. The upsert task keeps its own index of the
+    sheet, shared by every session's rows but by no other writer.
+    """
+    index = SheetIndex.load(get_worksheet(sheet_id)) if upsert else None
+    return SheetSync(get_result_store(), get_worksheet(sheet_id), limiter=get_sheets_limiter(), index=index).start()
+
+def run_sheet_operation(operation):
+    """
+    Runs a Google Sheets operation and shows any error in the app.
+    Returns True on success.
+    """
+    import gspread
+
+    try:
+        operation()
+        return True
+    except gspread.exceptions.SpreadsheetNotFound:
+        st.error("Error: Spreadsheet not found. Check your GOOGLE_SHEET_ID.")
+    except gspread.exceptions.APIError as e:
+        st.error(f"Google API Error: {e}")
+    except Exception as e:
+        st.error(f"Failed to write to Google Sheet: {e}")
+        st.info("Did you remember to share your Google Sheet with the service account email?")
+    return False
+
+def append_to_google_sheet(data_dict, image_name, writer, journal=None, job_id=None):
+    """
+    Adds the extracted data as a new row to the sheet writer,
+    which sends buffered rows to Google Sheets in batches.
+    """
+    return run_sheet_operation(lambda: write_page(writer, data_dict, image_name, journal, job_id))
+
+# --- Background Jobs ---
+
+@st.cache_resource
+def get_job_queue():
+    """
+    Opens the background job queue once per process.
+    """
+    return JobQueue()
+
+@st.cache_resource
+def get_worker_pool(provider, sheet_id):
+    """
+    Creates the pool of worker processes that run background jobs, once
+    per process; start() launches missing workers. Workers read the API
+    key from the environment.
+    """
+    # Secrets are only read when the environment doesn't already have the key
+    api_key_name = API_KEY_NAMES[provider]
+    api_key = os.getenv(api_key_name) or st.secrets.get(api_key_name)
+    if api_key:
+        os.environ[api_key_name] = api_key
+    return WorkerPool({
+        "provider": provider,
+        "sheet_id": sheet_id,
+        **get_service_account(),
+    })
+
+def show_jobs():
+    """
+    Shows the latest background jobs and their progress. Jobs belong to
+    no session, so any session (or a reloaded tab) sees them.
+    """
+    st.subheader("Background jobs")
+    for job in get_job_queue().jobs(limit=10):
+        total_pages = job["total_pages"] or 0
+        text = f"Job {job['id']}: {job['file_name']} ({job['state']}), {job['pages_done']} of {total_pages or '?'} pages"
+        if job["pages_failed"]:
+            text += f", {job['pages_failed']} failed"
+        st.progress(min(1.0, job["pages_done"] / total_pages) if total_pages else 0.0, text=text)
+        if job["state"] == FAILED:
+            st.error(f"Job {job['id']} failed: {job['error']}")
+
+# --- Run Metrics ---
+
+def show_run_metrics(run_metrics):
+    """
+    Shows where the run's time went and how many tokens it used, with the
+    raw spans and a Prometheus snapshot to download.
+    """
+    summary = run_metrics.summary()
+    tokens = summary["tokens"]
+    pages = summary["counters"].get("pages", 0)
+    with st.expander("Run metrics"):
+        columns = st.columns(4)
+        columns[0].metric("Pages", pages)
+        columns[1].metric("Pages / minute", round(pages * 60 / summary["seconds"], 1) if summary["seconds"] else 0)
+        columns[2].metric("Input tokens / page", tokens["input_tokens_per_page"])
+        columns[3].metric("Output tokens / page", tokens["output_tokens_per_page"])
+        st.dataframe([{"stage": stage, **values} for stage, values in summary["stages"].items()])
+        st.download_button("Download spans (JSON lines)", run_metrics.to_json_lines(), file_name="run_metrics.jsonl")
+        st.download_button("Download Prometheus metrics", run_metrics.to_prometheus(), file_name="run_metrics.prom")
+
+# --- Analysis ---
+
+def analyze_upload(uploaded_file, backend, label, sheet_id, options):
+    """
+    Analyzes the uploaded PDF in this session, showing every page as it
+    is written. options holds the form's settings (see run_app).
+    """
+    writer = None
+    page_num = None
+    # Stage timings and token usage for this run
+    run_metrics = RunMetrics().start()
+    try:
+        # 1. Count the pages; they are rendered as the analysis goes
+        st.info(f"Processing {uploaded_file.name}... This may take a moment.")
+        total_pages = count_uploaded_pages(uploaded_file)
+
+        if not total_pages:
+            st.error("No pages found in PDF or PDF processing failed. See error above.")
+            return
+
+        st.success(f"Found {total_pages} pages to analyze.")
+
+        # Pages already written by an earlier run of this PDF are skipped
+        journal = get_journal()
+        job_id = journal.start_job(uploaded_file.getvalue(), uploaded_file.name, total_pages)
+        if options["reprocess"]:
+            journal.reset_job(job_id)
+        pending_pages = journal.pending_pages(job_id, total_pages)
+        if len(pending_pages) < total_pages:
+            st.info(
+                f"Resuming: {total_pages - len(pending_pages)} of {total_pages} pages "
+                "were already written to the sheet."
+            )
+
+        progress_bar = st.progress(0, text="Starting analysis...")
+
+        # Rows are buffered and written to the sheet in batches
+        upsert = options["upsert"]
+        if options["use_store"]:
+            get_sheet_sync(sheet_id, upsert)
+            writer = StoreWriter(get_result_store(), upsert=upsert)
+        else:
+            writer = SheetWriter(
+                get_worksheet(sheet_id),
+                limiter=get_sheets_limiter(),
+                index=get_sheet_index(sheet_id) if upsert else None,
+            )
+
+        # 2. Analyze pages concurrently; results come back in page order
+        def on_page_done(done_count):
+            progress_bar.progress(
+                done_count / len(pending_pages),
+                text=f"Analyzed {done_count} of {len(pending_pages)} pages...",
+            )
+
+        ocr_cache = get_ocr_cache()
+        # The cache is shared by every session; count this run's lookups only
+        cache_before = ocr_cache.stats()
+
+        results = analyze_pdf(
+            uploaded_file.getvalue(), uploaded_file.name, backend, backend.model_name,
+            page_numbers=pending_pages,
+            journal=journal,
+            job_id=job_id,
+            profile_name=options["profile_name"],
+            max_workers=options["max_workers"],
+            batch_size=options["batch_size"],
+            response_format=options["response_format"],
+            ocr_cache=ocr_cache,
+            use_omr=options["use_omr"],
+            omr_read_header=options["omr_read_header"],
+            filter_pages=options["filter_pages"],
+            on_page_done=on_page_done,
+        )
+        for i, (image_name, image_data, data_dict, error) in enumerate(results):
+            page_num = pending_pages[i]
+
+            # Pages the filter kept away from the model have no image to show
+            if isinstance(error, PageSkipped):
+                st.info(f"Skipped {image_name}: {error}")
+                continue
+
+            st.image(image_data[0]["data"], caption=f"Analyzed: {image_name}")
+
+            # 3. Check the model's response for this page. Failed pages are
+            # not marked written, so running again retries them.
+            if isinstance(error, json.JSONDecodeError):
+                raise error
+            if error:
+                st.error(f"{label} API Error: {error}")
+            if not data_dict:
+                st.error(f"No response from {label} for page {page_num}. Skipping.")
+                continue
+
+            # 4. Queue this page's data for the Google Sheet
+            success = append_to_google_sheet(data_dict, image_name, writer, journal, job_id)
+            if success:
+                st.success(f"Queued data for {image_name} for the sheet.")
+            else:
+                st.error(f"Failed to append data for {image_name}.")
+
+        # Write the last partial batch for this PDF
+        with st.spinner("Writing remaining rows to sheet..."):
+            run_sheet_operation(writer.flush)
+
+        progress_bar.empty()
+        cache_stats = ocr_cache.stats()
+        st.caption(
+            f"OCR cache: {cache_stats['hits'] - cache_before['hits']} hits, "
+            f"{cache_stats['misses'] - cache_before['misses']} misses this run."
+        )
+        st.balloons()
+        st.header("Analysis Complete!")
+
+    except json.JSONDecodeError as e:
+        st.error(f"Error: {label}'s response for page {page_num} was not valid JSON. Stopping; run it again to resume from this page.")
+        st.subheader(f"Raw {label} Output:")
+        st.text(e.doc)
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
+        st.info("Please ensure your `service_account.json` file (for local) or secrets (for deployment) are correct and you have shared your Google Sheet with the service account email.")
+    finally:
+        # Write whatever is still buffered, even if the run stopped partway
+        if isinstance(writer, StoreWriter):
+            writer.flush()
+            get_sheet_sync(sheet_id, writer.upsert).wake()
+            st.info(
+                f"{writer.rows_written} rows saved locally; "
+                f"{get_result_store().counts()['pending_sync']} rows waiting to sync to Google Sheet."
+            )
+        elif writer is not None:
+            run_sheet_operation(writer.flush)
+            st.info(
+                f"{writer.rows_written} rows written to Google Sheet "
+                f"({writer.rows_updated} updated, {writer.rows_skipped} unchanged rows skipped)."
+            )
+        run_metrics.stop()
+        show_run_metrics(run_metrics)
+
+# --- Streamlit App ---
+
+def run_app(provider, get_provider_backend, label, page_title, header, sheet_id,
+            max_batch_size=8, unset_sheet_ids=("YOUR_SHEET_ID_HERE",)):
+    """
+    Runs the app for one provider ("gemini" or "groq"). get_provider_backend
+    is the app's cached backend getter; label names the model in messages.
+    max_batch_size caps the pages per request slider. Submitting with a
+    sheet_id in unset_sheet_ids asks for the app's own sheet id instead.
+    """
+    st.set_page_config(page_title=page_title)
+    st.header(header)
+
+    # The prompt lives in pipeline.py, shared by both apps and batch_cli.py
+
+    uploaded_file = st.file_uploader("Upload an answer script PDF (pdf)...", type=["pdf"])
+
+    # Smaller page images upload faster and cost fewer image tokens
+    profile_name = st.selectbox(
+        "Page encoding", list(ENCODE_PROFILES), index=list(ENCODE_PROFILES).index(DEFAULT_PROFILE)
+    )
+
+    if uploaded_file is not None:
+        with st.expander("Compare encoding profiles"):
+            if st.button("Measure bytes and encode time per profile"):
+                with st.spinner("Encoding the first pages with every profile..."):
+                    st.dataframe(profile_report(uploaded_file.getvalue()))
+
+    # The compact format returns one answer string per section instead of 80 JSON entries
+    response_format = st.selectbox(
+        "Response format", list(RESPONSE_FORMATS), index=list(RESPONSE_FORMATS).index(DEFAULT_RESPONSE_FORMAT)
+    )
+
+    if uploaded_file is not None:
+        with st.expander("Compare response formats"):
+            if st.button("Measure output tokens and latency per format"):
+                with st.spinner("Asking the model about the first pages in every format..."):
+                    backend = get_backend(get_provider_backend, label, API_KEY_NAMES[provider])
+                    st.dataframe(response_format_report(uploaded_file.getvalue(), uploaded_file.name, backend))
+
+    # Number of pages analyzed at the same time
+    max_workers = st.slider("Concurrent requests", min_value=1, max_value=16, value=DEFAULT_MAX_WORKERS)
+
+    # Several pages per request share one copy of the instructions
+    batch_size = st.slider(
+        "Pages per request", min_value=1, max_value=max_batch_size, value=min(DEFAULT_BATCH_SIZE, max_batch_size)
+    )
+
+    # Read answer bubbles on the CPU and only ask the model about unclear cells
+    use_omr = st.checkbox("Read answer bubbles locally (OMR)")
+    omr_read_header = True
+    if use_omr:
+        omr_read_header = not st.checkbox(
+            "Skip the model when every answer is clear (leaves Name and Application No blank)"
+        )
+
+    # Blank, cover and instruction pages are recognized locally and never sent to the model
+    filter_pages = st.checkbox("Skip pages without answer grids (blank, cover and instruction pages)")
+
+    # Re-processed scripts update their existing row instead of adding a duplicate
+    upsert = st.checkbox("Update existing rows (match on Application No or Image Name)")
+
+    # A PDF seen before normally resumes after its last written page; this writes every page again
+    reprocess = st.checkbox("Reprocess from scratch (ignore pages already written for this PDF)")
+
+    # Pages are saved to a local database right away and copied to the sheet in the background
+    use_store = st.checkbox("Save results locally and sync them to the sheet in the background")
+
+    # Background jobs run in worker processes: they keep going if this tab is closed
+    background = st.checkbox("Run in the background (uploads run in parallel and survive closing the tab)")
+
+    submit = st.button("Analyze PDF and Append to Sheet")
+
+    if submit and uploaded_file is not None:
+        if sheet_id in unset_sheet_ids:
+            st.error("Please paste your *own* GOOGLE_SHEET_ID into the app file first.")
+        elif background:
+            job_id = get_job_queue().enqueue(uploaded_file.getvalue(), uploaded_file.name, provider, {
+                "profile_name": profile_name,
+                "max_workers": max_workers,
+                "batch_size": batch_size,
+                "response_format": response_format,
+                "use_omr": use_omr,
+                "omr_read_header": omr_read_header,
+                "filter_pages": filter_pages,
+                "upsert": upsert,
+            })
+            # Restarts any worker that died
+            get_worker_pool(provider, sheet_id).start()
+            st.success(f"Queued {uploaded_file.name} as job {job_id}. Progress is shown below; you can close this tab.")
+        else:
+            backend = get_backend(get_provider_backend, label, API_KEY_NAMES[provider])
+            analyze_upload(uploaded_file, backend, label, sheet_id, {
+                "profile_name": profile_name,
+                "max_workers": max_workers,
+                "batch_size": batch_size,
+                "response_format": response_format,
+                "use_omr": use_omr,
+                "omr_read_header": omr_read_header,
+                "filter_pages": filter_pages,
+                "upsert": upsert,
+                "reprocess": reprocess,
+                "use_store": use_store,
+            })
+
+    # --- Background Jobs Panel ---
+
+    job_counts = get_job_queue().counts()
+    if job_counts:
+        jobs_active = bool(job_counts.get(QUEUED) or job_counts.get(RUNNING))
+        if jobs_active:
+            # Jobs left over from before a restart are picked up again
+            get_worker_pool(provider, sheet_id).start()
+        # Only the panel reruns while polling, not the whole script
+        st.fragment(show_jobs, run_every=JOB_POLL_SECONDS if jobs_active else None)()
@@ -0,0 +1,365 @@
+import base64
+import collections
+import concurrent.futures
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from metrics import span, record_usage
+from rate_limit import RateLimiter, call_with_retry, estimate_tokens, split_quota, PROVIDER_LIMITS, DEFAULT_MAX_ATTEMPTS
+
+# --- Configuration ---
+
+GEMINI_MODEL = "gemini-2.0-flash-lite"
+GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+# Latency samples kept per backend for the p95 estimate
+LATENCY_WINDOW = 50
+# Consecutive errors before a backend is rested, and for how long (seconds)
+MAX_CONSECUTIVE_ERRORS = 3
+ERROR_COOLDOWN = 30.0
+# Images Groq accepts in one request
+GROQ_MAX_IMAGES = 5
+GROQ_MAX_TOKENS = 8192
+# Attempts per provider inside a Router before failing over to the next one
+ROUTER_MAX_ATTEMPTS = 2
+# Hedge delay used until a backend has enough latency samples (seconds)
+DEFAULT_HEDGE_DELAY = 10.0
+MIN_HEDGE_SAMPLES = 5
+# Concurrent callers a hedging Router is sized for when not told
+DEFAULT_HEDGE_WORKERS = 8
+
+
+class OcrBackend:
+    """
+    A vision model that reads a page. Backends are called like the old
+    get_*_response functions: backend(prompt, image_data, user_input) -> text.
+    model_name identifies the model in cache keys. image_data may hold
+    several pages; max_images is how many one request accepts (None if
+    the provider has no small limit).
+    """
+
+    name = "backend"
+    model_name = ""
+    max_images = None
+
+    def ask(self, prompt, image_data, user_input):
+        raise NotImplementedError
+
+    def __call__(self, prompt, image_data, user_input):
+        return self.ask(prompt, image_data, user_input)
+
+
+class GeminiBackend(OcrBackend):
+    """Gemini, using multimodal input (text + image)."""
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def ask(self, prompt, image_data, user_input):
+        response = self._model.generate_content(
+            [user_input, *image_data, prompt]
+        )
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            record_usage(self.model_name, usage.prompt_token_count, usage.candidates_token_count)
+        return response.text
+
+
+class GroqBackend(OcrBackend):
+    """Groq, using the Llama 4 Scout vision model in JSON mode."""
+
+    name = "groq"
+    max_images = GROQ_MAX_IMAGES
+
+    def __init__(self, api_key, model_name=GROQ_MODEL):
+        import groq
+
+        self.model_name = model_name
+        self._client = groq.Groq(api_key=api_key)
+
+    def ask(self, prompt, image_data, user_input):
+        # 1. Encode each page image to a base64 data URL, in page order
+        with span("base64"):
+            image_parts = [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{image['mime_type']};base64,{base64.b64encode(image['data']).decode('utf-8')}",
+                    },
+                }
+                for image in image_data
+            ]
+
+        # 2. Combine prompts
+        combined_prompt_text = f"{prompt}\n\n{user_input}"
+
+        # 3. Call the Groq API
+        chat_completion = self._client.chat.completions.create(
+            messages=[
+                {
+                    "role": "user",
+                    "content": [{"type": "text", "text": combined_prompt_text}, *image_parts],
+                }
+            ],
+            model=self.model_name,
+            # Use JSON mode for reliable output
+            response_format={"type": "json_object"},
+            # Room for every page's answers, up to the model's output limit
+            max_tokens=min(GROQ_MAX_TOKENS, 4096 * len(image_data))
+        )
+        usage = getattr(chat_completion, "usage", None)
+        if usage is not None:
+            record_usage(self.model_name, usage.prompt_tokens, usage.completion_tokens)
+        return chat_completion.choices[0].message.content
+
+
+class StubBackend(OcrBackend):
+    """
+    Local stand-in for a provider, for testing and benchmarks. Sleeps for
+    latency +/- jitter seconds, fails with probability fail_rate, and
+    returns response (a dict, serialized as JSON) or blank answers.
+    """
+
+    def __init__(self, name="stub", latency=0.0, jitter=0.0, fail_rate=0.0, response=None, seed=None):
+        self.name = name
+        self.model_name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.response = response if response is not None else {"Name": "", "Application_No": ""}
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def ask(self, prompt, image_data, user_input):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.fail_rate
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{self.name}: simulated provider error")
+        return json.dumps(self.response)
+
+
+class RateLimitedBackend(OcrBackend):
+    """
+    Wraps a backend with a shared client-side rate limiter and retries
+    throttling and transient errors with backoff, so pages don't fail
+    on a 429 or a passing 5xx.
+    """
+
+    def __init__(self, backend, limiter, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.backend = backend
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.name = backend.name
+        self.model_name = backend.model_name
+        self.max_images = backend.max_images
+
+    def ask(self, prompt, image_data, user_input):
+        return call_with_retry(
+            lambda: self.backend.ask(prompt, image_data, user_input),
+            self.limiter,
+            tokens=estimate_tokens(prompt, user_input, images=len(image_data)),
+            max_attempts=self.max_attempts,
+        )
+
+
+class _BackendHealth:
+    """Latency and error tracking for one backend inside a Router."""
+
+    def __init__(self):
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.in_flight = 0
+        self.consecutive_errors = 0
+        self.resting_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def p95(self):
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def mean_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+
+class Router(OcrBackend):
+    """
+    Spreads pages across several backends. Each request goes to the
+    healthy backend with the lowest expected wait (mean latency times
+    requests in flight); a failing backend is retried on the next one,
+    and a backend with repeated errors is rested for a while.
+
+    With hedge=True, if the chosen backend hasn't answered by its p95
+    latency, the same page is also sent to the next backend and the
+    first answer wins. max_workers is the number of threads calling ask
+    at once; the hedging pool has room for each of them to reach every
+    backend, so no call waits for a thread.
+    """
+
+    name = "router"
+
+    def __init__(self, backends, hedge=False, max_consecutive_errors=MAX_CONSECUTIVE_ERRORS,
+                 error_cooldown=ERROR_COOLDOWN, max_workers=DEFAULT_HEDGE_WORKERS):
+        if not backends:
+            raise ValueError("Router needs at least one backend")
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.max_consecutive_errors = max_consecutive_errors
+        self.error_cooldown = error_cooldown
+        self.model_name = "+".join(b.model_name for b in self.backends)
+        limits = [b.max_images for b in self.backends if b.max_images]
+        self.max_images = min(limits) if limits else None
+        self.hedges = 0
+        self._health = {id(b): _BackendHealth() for b in self.backends}
+        self._lock = threading.Lock()
+        self._hedge_pool = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_workers * len(self.backends)) if hedge else None
+        )
+
+    def _ranked(self):
+        """Backends in the order they should be tried."""
+        now = time.monotonic()
+        with self._lock:
+            def expected_wait(backend):
+                health = self._health[id(backend)]
+                return (health.in_flight + 1) * (health.mean_latency() or 0.001)
+
+            healthy = [b for b in self.backends if self._health[id(b)].resting_until <= now]
+            resting = [b for b in self.backends if b not in healthy]
+            # Resting backends are still tried last rather than failing the page
+            return sorted(healthy, key=expected_wait) + resting
+
+    def _call(self, backend, prompt, image_data, user_input, started=None):
+        health = self._health[id(backend)]
+        with self._lock:
+            health.in_flight += 1
+            health.requests += 1
+        if started:
+            started.set()
+        start = time.monotonic()
+        try:
+            response_text = backend.ask(prompt, image_data, user_input)
+        except Exception:
+            with self._lock:
+                health.in_flight -= 1
+                health.errors += 1
+                health.consecutive_errors += 1
+                if health.consecutive_errors >= self.max_consecutive_errors:
+                    health.resting_until = time.monotonic() + self.error_cooldown
+            raise
+        with self._lock:
+            health.in_flight -= 1
+            health.consecutive_errors = 0
+            health.latencies.append(time.monotonic() - start)
+        return response_text
+
+    def ask(self, prompt, image_data, user_input):
+        ranked = self._ranked()
+        if self.hedge and len(ranked) > 1:
+            return self._ask_hedged(ranked, prompt, image_data, user_input)
+
+        last_error = None
+        for backend in ranked:
+            try:
+                return self._call(backend, prompt, image_data, user_input)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _ask_hedged(self, ranked, prompt, image_data, user_input):
+        primary = ranked[0]
+        with self._lock:
+            delay = self._health[id(primary)].p95() or DEFAULT_HEDGE_DELAY
+
+        started = threading.Event()
+        # Calls run in a copy of the caller's context, so run metrics follow them
+        pending = {self._hedge_pool.submit(
+            contextvars.copy_context().run, self._call, primary, prompt, image_data, user_input, started
+        )}
+        # The delay counts from when the primary call begins, not from when it was queued
+        started.wait()
+        remaining = ranked[1:]
+        timeout = delay
+        last_error = None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+            # Primary is slow (past its p95) or failed: send the page to the next backend too
+            if remaining and (not done or not pending):
+                if not done:
+                    with self._lock:
+                        self.hedges += 1
+                pending.add(self._hedge_pool.submit(
+                    contextvars.copy_context().run, self._call, remaining.pop(0), prompt, image_data, user_input
+                ))
+            if not remaining:
+                timeout = None
+        raise last_error
+
+    def stats(self):
+        """Per-backend request, error and latency figures."""
+        with self._lock:
+            return {
+                backend.name: {
+                    "requests": health.requests,
+                    "errors": health.errors,
+                    "mean_latency": round(health.mean_latency(), 3),
+                    "p95_latency": round(health.p95() or 0.0, 3),
+                    "resting": health.resting_until > time.monotonic(),
+                }
+                for backend in self.backends
+                for health in [self._health[id(backend)]]
+            }
+
+
+def make_backend(provider, hedge=False, limits=None, max_attempts=DEFAULT_MAX_ATTEMPTS, share=1,
+                 max_workers=DEFAULT_HEDGE_WORKERS):
+    """
+    Builds a backend from a provider name: "gemini", "groq" or "stub".
+    A comma-separated list ("gemini,groq") builds a Router over them.
+    API keys come from GOOGLE_API_KEY / GROQ_API_KEY. Real providers are
+    rate limited with PROVIDER_LIMITS, updated by limits (e.g.
+    {"requests_per_minute": 60}); stubs only when limits are given.
+    share is the number of processes using the same quota; each gets an
+    equal part of it. max_workers is the number of threads that will call
+    the backend at once, which sizes a hedging Router.
+    """
+    names = [n.strip() for n in provider.split(",") if n.strip()]
+    if len(names) > 1:
+        members = [make_backend(n, limits=limits, max_attempts=ROUTER_MAX_ATTEMPTS, share=share) for n in names]
+        return Router(members, hedge=hedge, max_workers=max_workers)
+
+    name = names[0] if names else ""
+    if name == "gemini":
+        backend = GeminiBackend(os.getenv("GOOGLE_API_KEY"))
+    elif name == "groq":
+        backend = GroqBackend(os.getenv("GROQ_API_KEY"))
+    elif name == "stub":
+        backend = StubBackend()
+        if not limits:
+            return backend
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+
+    quota = dict(PROVIDER_LIMITS.get(name, {}))
+    quota.update(limits or {})
+    return RateLimitedBackend(backend, RateLimiter(name=name, **split_quota(quota, share)), max_attempts=max_attempts)
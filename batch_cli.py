@@ -0,0 +1,171 @@
+"""
+Headless batch processing of answer script PDFs, without Streamlit.
+
+Example:
+    python batch_cli.py "scans/*.pdf" more_scans/ --provider groq --file-workers 2 --page-workers 8
+    python batch_cli.py scans/ --provider gemini,groq --hedge
+    python batch_cli.py scans/ --provider gemini --batch-size 4
+    python batch_cli.py scans/sample.pdf --compare-formats
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from pdf_pages import ENCODE_PROFILES, DEFAULT_PROFILE
+from ocr_pool import DEFAULT_MAX_WORKERS
+from ocr_cache import OcrCache, DEFAULT_CACHE_PATH
+from sheets import open_worksheet, ensure_header_row, SheetWriter, SheetIndex, DEFAULT_FLUSH_EVERY
+from journal import JobJournal, DEFAULT_JOURNAL_PATH
+from backends import make_backend, Router
+from rate_limit import RateLimiter, PROVIDER_LIMITS
+from metrics import RunMetrics
+from result_store import ResultStore, StoreWriter, SheetSync
+from pipeline import run_batch, response_format_report, DEFAULT_BATCH_SIZE, RESPONSE_FORMATS, DEFAULT_RESPONSE_FORMAT
+
+# Same sheet the Streamlit apps write to
+GOOGLE_SHEET_ID = "1Vzb3o4MyexMxK7AWp8ChTW08dBAWwQr-_QXs8tSY8zQ"
+SERVICE_ACCOUNT_FILE = "service_account.json"
+
+
+def find_pdfs(inputs):
+    """
+    Expands directories and glob patterns into a sorted list of PDF paths.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            item = os.path.join(item, "**", "*.pdf")
+        paths.update(p for p in glob.glob(item, recursive=True) if p.lower().endswith(".pdf"))
+    return sorted(paths)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze answer script PDFs and append the results to Google Sheets.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--provider", default="gemini",
+                        help="gemini, groq or stub; a comma-separated list (gemini,groq) routes pages across them")
+    parser.add_argument("--hedge", action="store_true",
+                        help="With several providers, resend slow pages (past p95 latency) to the next provider")
+    parser.add_argument("--rpm", type=int, help="Requests per minute per provider (default: provider quota)")
+    parser.add_argument("--tpm", type=int, help="Tokens per minute per provider (default: provider quota)")
+    parser.add_argument("--sheet-id", default=GOOGLE_SHEET_ID)
+    parser.add_argument("--service-account", default=SERVICE_ACCOUNT_FILE, help="Service account JSON file")
+    parser.add_argument("--file-workers", type=int, default=1, help="PDFs processed at the same time")
+    parser.add_argument("--page-workers", type=int, default=DEFAULT_MAX_WORKERS, help="Concurrent model requests per PDF")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Pages sent in one model request (Groq takes at most 5)")
+    parser.add_argument("--response-format", choices=list(RESPONSE_FORMATS), default=DEFAULT_RESPONSE_FORMAT,
+                        help="Answer format asked of the model; compact uses one answer string per section")
+    parser.add_argument("--compare-formats", action="store_true",
+                        help="Compare output tokens and latency of the response formats on the first PDF, then exit")
+    parser.add_argument("--profile", choices=list(ENCODE_PROFILES), default=DEFAULT_PROFILE, help="Page encoding profile")
+    parser.add_argument("--flush-every", type=int, default=DEFAULT_FLUSH_EVERY, help="Rows per Sheets write")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Update rows already in the sheet (matched on Application_No or Image Name) instead of appending")
+    parser.add_argument("--store",
+                        help="Write results to this local SQLite store and mirror them to the sheet in the background")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="OCR cache file")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH, help="Job journal file used to resume runs")
+    parser.add_argument("--no-journal", action="store_true", help="Don't record or resume page progress")
+    parser.add_argument("--metrics-jsonl", help="Write every stage span and token usage event to this JSON lines file")
+    parser.add_argument("--metrics-prometheus", help="Write the run's stage percentiles and token totals in Prometheus text format")
+    parser.add_argument("--omr", action="store_true", help="Read answer bubbles locally")
+    parser.add_argument("--omr-answers-only", action="store_true",
+                        help="With --omr, skip the model when every answer is clear")
+    parser.add_argument("--filter-pages", action="store_true",
+                        help="Skip blank, cover and instruction pages (no answer grids) before calling the model")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    paths = find_pdfs(args.inputs)
+    if not paths:
+        print("No PDF files found.", file=sys.stderr)
+        return 1
+
+    limits = {}
+    if args.rpm:
+        limits["requests_per_minute"] = args.rpm
+    if args.tpm:
+        limits["tokens_per_minute"] = args.tpm
+    backend = make_backend(
+        args.provider, hedge=args.hedge, limits=limits, max_workers=args.file_workers * args.page_workers
+    )
+    if args.compare_formats:
+        with open(paths[0], "rb") as f:
+            report = response_format_report(f.read(), os.path.basename(paths[0]), backend, profile_name=args.profile)
+        print(json.dumps(report, indent=2))
+        return 0
+
+    ocr_cache = None if args.no_cache else OcrCache(args.cache)
+    journal = None if args.no_journal else JobJournal(args.journal)
+
+    worksheet = open_worksheet(args.sheet_id, service_account_file=args.service_account)
+    if ensure_header_row(worksheet):
+        print("Created new header row in Google Sheet.")
+    sheets_limiter = RateLimiter(name="sheets", **PROVIDER_LIMITS["sheets"])
+    index = None
+    if args.upsert:
+        index = SheetIndex.load(worksheet, sheets_limiter)
+        print(f"Indexed {len(index)} existing rows.")
+    sheet_sync = None
+    if args.store:
+        # Pages only wait on the local store; the sheet catches up in the background
+        store = ResultStore(args.store)
+        sheet_sync = SheetSync(store, worksheet, limiter=sheets_limiter, index=index).start()
+        writer = StoreWriter(store, upsert=index is not None)
+    else:
+        writer = SheetWriter(worksheet, flush_every=args.flush_every, limiter=sheets_limiter, index=index)
+
+    print(f"Processing {len(paths)} PDFs with {args.provider} ({backend.model_name})...")
+    run_metrics = RunMetrics().start()
+    stats = run_batch(
+        paths, backend, backend.model_name, writer,
+        file_workers=args.file_workers,
+        max_workers=args.page_workers,
+        batch_size=args.batch_size,
+        response_format=args.response_format,
+        profile_name=args.profile,
+        ocr_cache=ocr_cache,
+        journal=journal,
+        use_omr=args.omr,
+        omr_read_header=not args.omr_answers_only,
+        filter_pages=args.filter_pages,
+    )
+    if sheet_sync is not None:
+        print("Syncing remaining rows to the sheet...")
+        sheet_sync.stop(drain=True)
+        stats["store"] = sheet_sync.stats()
+    run_metrics.stop()
+    stats["metrics"] = run_metrics.summary()
+    if args.metrics_jsonl:
+        with open(args.metrics_jsonl, "w") as f:
+            f.write(run_metrics.to_json_lines())
+    if args.metrics_prometheus:
+        with open(args.metrics_prometheus, "w") as f:
+            f.write(run_metrics.to_prometheus())
+    if index is not None:
+        sheet_writer = sheet_sync.writer if sheet_sync is not None else writer
+        stats["rows_updated"] = sheet_writer.rows_updated
+        stats["rows_skipped"] = sheet_writer.rows_skipped
+    if ocr_cache is not None:
+        stats["cache"] = ocr_cache.stats()
+    if isinstance(backend, Router):
+        stats["providers"] = backend.stats()
+        stats["hedged_requests"] = backend.hedges
+    print(json.dumps(stats, indent=2))
+    return 0 if not stats["files_failed"] and not stats["pages_failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""
+Offline benchmark of the pipeline, with no model or Google credentials.
+
+Synthetic answer-script PDFs are generated locally, the model is a stub
+with configurable latency, and the sheet is a fake worksheet. Every
+combination of page count, DPI and concurrency runs in its own process
+so peak RSS is measured per scenario. Rasterizing still needs Poppler.
+
+Example:
+    python benchmark.py --pages 10,50 --dpi 100,200 --workers 1,4,8
+    python benchmark.py --baseline benchmark_report.json --output new_report.json
+    python benchmark.py --hedge-check
+"""
+import argparse
+import concurrent.futures
+import io
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from PIL import Image, ImageDraw
+import pipeline
+from pdf_pages import ENCODE_PROFILES, DEFAULT_PROFILE
+from omr import GRID_TEMPLATE, OPTIONS
+from backends import StubBackend, Router
+from compact_format import COMPACT_PROMPT, COMPACT_BATCH_PROMPT, encode_compact, approx_tokens
+from sheets import SheetWriter, SECTIONS
+from metrics import RunMetrics, record_usage
+from rate_limit import IMAGE_TOKENS
+
+# --- Configuration ---
+
+DEFAULT_REPORT_PATH = "benchmark_report.json"
+
+# Stub latencies (seconds): per model request, per output token, per Sheets call
+MODEL_LATENCY = 1.0
+MODEL_JITTER = 0.2
+TOKEN_LATENCY = 0.002
+SHEETS_LATENCY = 0.3
+
+# A scenario is a regression if its pages/sec drops by more than this fraction
+DEFAULT_TOLERANCE = 0.15
+
+# Settings that identify a scenario when comparing against a baseline
+SCENARIO_KEYS = ("pages", "dpi", "workers", "batch_size", "response_format", "profile")
+
+# Hedging check: callers (more than a fixed pool of 8), pages and steady stub latency (seconds)
+HEDGE_CHECK_WORKERS = 16
+HEDGE_CHECK_PAGES = 48
+HEDGE_CHECK_LATENCY = 0.5
+# With steady latency only the slowest few percent of requests should be hedged
+HEDGE_CHECK_MAX_HEDGES = 0.15
+
+# --- Synthetic Inputs ---
+
+def synthetic_answers(rng):
+    """A random result dict, roughly one blank answer in ten."""
+    answers = {"Name": f"Candidate {rng.randrange(10000)}", "Application_No": str(rng.randrange(10**5, 10**6))}
+    for section, _, count in SECTIONS:
+        answers[section] = {str(i): "" if rng.random() < 0.1 else rng.choice(OPTIONS) for i in range(1, count + 1)}
+    return answers
+
+
+def draw_page(answers, dpi):
+    """Draws an A4 answer script with the OMR grids and filled bubbles."""
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    img = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    draw.text((width * 0.05, height * 0.05), f"Name: {answers['Name']}", fill=0)
+    draw.text((width * 0.05, height * 0.08), f"Application No: {answers['Application_No']}", fill=0)
+    for grid in GRID_TEMPLATE:
+        left, top, right, bottom = [v * s for v, s in zip(grid["box"], (width, height, width, height))]
+        cell_h = (bottom - top) / grid["questions"]
+        cell_w = (right - left) / len(OPTIONS)
+        for i in range(grid["questions"] + 1):
+            draw.line((left, top + i * cell_h, right, top + i * cell_h), fill=0, width=2)
+        for j in range(len(OPTIONS) + 1):
+            draw.line((left + j * cell_w, top, left + j * cell_w, bottom), fill=0, width=2)
+        for i in range(grid["questions"]):
+            marked = answers[grid["section"]].get(str(i + 1))
+            for j, option in enumerate(OPTIONS):
+                cx, cy = left + (j + 0.5) * cell_w, top + (i + 0.5) * cell_h
+                r = min(cell_w, cell_h) * 0.3
+                draw.ellipse((cx - r, cy - r, cx + r, cy + r), outline=0, fill=30 if marked == option else None)
+    return img
+
+
+def synthetic_pdf(pages, dpi=150, seed=0):
+    """Returns (pdf_bytes, answers per page) for a PDF of pages answer scripts."""
+    rng = random.Random(seed)
+    answers = [synthetic_answers(rng) for _ in range(pages)]
+    images = [draw_page(a, dpi) for a in answers]
+    buffer = io.BytesIO()
+    images[0].save(buffer, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return buffer.getvalue(), answers
+
+# --- Fake Backends ---
+
+class FakeModel(StubBackend):
+    """
+    Stub model that answers in whichever response format it was asked for,
+    one page per image. Latency is per request plus per output token, so
+    batching and compact responses show up in the numbers.
+    """
+
+    def __init__(self, answers, latency=MODEL_LATENCY, jitter=MODEL_JITTER,
+                 token_latency=TOKEN_LATENCY, seed=None):
+        super().__init__("fake-model", latency, jitter, seed=seed)
+        self.answers = answers
+        self.token_latency = token_latency
+
+    def ask(self, prompt, image_data, user_input):
+        compact = prompt in (COMPACT_PROMPT, COMPACT_BATCH_PROMPT)
+        results = [self.answers[self.calls % len(self.answers)] for _ in image_data]
+        results = [encode_compact(r) if compact else r for r in results]
+        if len(image_data) > 1:
+            names = re.findall(r'"([^"]+)"', user_input)
+            response_text = json.dumps(dict(zip(names, results)))
+        else:
+            response_text = json.dumps(results[0], indent=2)
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        output_tokens = approx_tokens(response_text)
+        time.sleep(delay + self.token_latency * output_tokens)
+        record_usage(self.model_name, approx_tokens(prompt + user_input) + IMAGE_TOKENS * len(image_data), output_tokens)
+        return response_text
+
+
+class FakeWorksheet:
+    """In-memory stand-in for a gspread worksheet, with a fixed latency per call."""
+
+    def __init__(self, latency=SHEETS_LATENCY):
+        self.latency = latency
+        self.values = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def row_values(self, row):
+        self._call()
+        return self.values[row - 1] if row <= len(self.values) else []
+
+    def get_all_values(self):
+        self._call()
+        return [list(row) for row in self.values]
+
+    def append_row(self, row):
+        self.append_rows([row])
+
+    def append_rows(self, rows):
+        self._call()
+        with self._lock:
+            start = len(self.values) + 1
+            self.values.extend([str(v) for v in row] for row in rows)
+        return {"updates": {"updatedRange": f"Sheet1!A{start}:A{start + len(rows) - 1}"}}
+
+    def batch_update(self, data):
+        self._call()
+        with self._lock:
+            for item in data:
+                row = int(re.match(r"A(\d+)", item["range"]).group(1))
+                self.values[row - 1] = [str(v) for v in item["values"][0]]
+
+# --- Measurement ---
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size of this process (or its children) in MB."""
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_scenario(scenario, pdf_bytes, answers):
+    """
+    Runs one scenario through analyze_pdf and the sheet writer, timing
+    each stage. Meant to run in a fresh process so peak RSS is its own.
+    """
+    model = FakeModel(answers, scenario["model_latency"], scenario["model_jitter"], scenario["token_latency"], seed=0)
+    worksheet = FakeWorksheet(scenario["sheets_latency"])
+    writer = SheetWriter(worksheet, flush_every=scenario["flush_every"])
+
+    profile = dict(ENCODE_PROFILES[scenario["profile"]], dpi=scenario["dpi"])
+    pages = failed = 0
+    start = time.perf_counter()
+    with RunMetrics() as run_metrics:
+        results = pipeline.analyze_pdf(
+            pdf_bytes, "benchmark.pdf", model, model.model_name,
+            total_pages=scenario["pages"],
+            profile=profile,
+            max_workers=scenario["workers"],
+            batch_size=scenario["batch_size"],
+            response_format=scenario["response_format"],
+        )
+        for image_name, _, data_dict, error in results:
+            if error or not data_dict:
+                failed += 1
+                continue
+            pipeline.write_page(writer, data_dict, image_name)
+            pages += 1
+        writer.flush()
+    seconds = time.perf_counter() - start
+    summary = run_metrics.summary()
+
+    return dict(
+        scenario,
+        pages_written=pages,
+        pages_failed=failed,
+        seconds=round(seconds, 3),
+        pages_per_second=round(pages / seconds, 3) if seconds else 0.0,
+        model_requests=model.calls,
+        sheets_calls=worksheet.calls,
+        stages=summary["stages"],
+        tokens=summary["tokens"],
+        peak_rss_mb=peak_rss_mb(),
+        peak_child_rss_mb=peak_rss_mb(resource.RUSAGE_CHILDREN),
+    )
+
+
+def hedge_check(workers=HEDGE_CHECK_WORKERS, pages=HEDGE_CHECK_PAGES, latency=HEDGE_CHECK_LATENCY):
+    """
+    Sends pages to a hedging Router over two stub backends from workers
+    threads at once. With steady latency few requests should be hedged
+    and every caller should have a request in flight, so the run takes
+    about pages / workers request latencies. Calls queueing inside the
+    router show up as extra hedges and a longer run. Returns the figures
+    and a list of problems (empty when the check passes).
+    """
+    router = Router(
+        [StubBackend("stub-a", latency, latency * 0.1, seed=1), StubBackend("stub-b", latency, latency * 0.1, seed=2)],
+        hedge=True, max_workers=workers,
+    )
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda _: router.ask("", [{}], ""), range(pages)))
+    seconds = time.perf_counter() - start
+    expected = -(-pages // workers) * latency
+    result = {
+        "workers": workers,
+        "pages": pages,
+        "requests": sum(s["requests"] for s in router.stats().values()),
+        "hedges": router.hedges,
+        "seconds": round(seconds, 3),
+        "expected_seconds": expected,
+        "problems": [],
+    }
+    if router.hedges > pages * HEDGE_CHECK_MAX_HEDGES:
+        result["problems"].append(f"{router.hedges} of {pages} pages hedged")
+    if seconds > expected * 1.5:
+        result["problems"].append(f"took {seconds:.2f}s, expected about {expected:.2f}s")
+    return result
+
+
+def _run_in_process(args):
+    return run_scenario(*args)
+
+
+def scenario_key(scenario):
+    return tuple(scenario.get(k) for k in SCENARIO_KEYS)
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns the scenarios whose pages/sec fell more than tolerance below the baseline."""
+    previous = {scenario_key(r): r for r in baseline.get("scenarios", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(scenario_key(result))
+        if before and result["pages_per_second"] < before["pages_per_second"] * (1 - tolerance):
+            regressions.append({
+                "scenario": {k: result[k] for k in SCENARIO_KEYS},
+                "baseline_pages_per_second": before["pages_per_second"],
+                "pages_per_second": result["pages_per_second"],
+            })
+    return regressions
+
+
+def int_list(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline with stub model and Sheets backends.")
+    parser.add_argument("--pages", type=int_list, default=[10, 40], help="Page counts, comma-separated")
+    parser.add_argument("--dpi", type=int_list, default=[100, 200], help="Render DPIs, comma-separated")
+    parser.add_argument("--workers", type=int_list, default=[1, 4, 8], help="Concurrency levels, comma-separated")
+    parser.add_argument("--batch-size", type=int_list, default=[pipeline.DEFAULT_BATCH_SIZE],
+                        help="Pages per model request, comma-separated")
+    parser.add_argument("--response-format", choices=list(pipeline.RESPONSE_FORMATS),
+                        default=pipeline.DEFAULT_RESPONSE_FORMAT)
+    parser.add_argument("--profile", choices=list(ENCODE_PROFILES), default=DEFAULT_PROFILE,
+                        help="Encoding profile; its DPI is replaced by --dpi")
+    parser.add_argument("--model-latency", type=float, default=MODEL_LATENCY, help="Seconds per model request")
+    parser.add_argument("--model-jitter", type=float, default=MODEL_JITTER)
+    parser.add_argument("--token-latency", type=float, default=TOKEN_LATENCY, help="Seconds per output token")
+    parser.add_argument("--sheets-latency", type=float, default=SHEETS_LATENCY, help="Seconds per Sheets call")
+    parser.add_argument("--flush-every", type=int, default=25, help="Rows per Sheets write")
+    parser.add_argument("--output", default=DEFAULT_REPORT_PATH, help="Where to write the JSON report")
+    parser.add_argument("--baseline", help="Earlier report to compare pages/sec against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed pages/sec drop against the baseline, as a fraction")
+    parser.add_argument("--hedge-check", action="store_true",
+                        help="Only check that a hedging Router doesn't hedge or queue calls under load")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.hedge_check:
+        result = hedge_check()
+        print(json.dumps(result, indent=2))
+        return 1 if result["problems"] else 0
+
+    scenarios = [
+        {
+            "pages": pages, "dpi": dpi, "workers": workers, "batch_size": batch_size,
+            "response_format": args.response_format, "profile": args.profile,
+            "model_latency": args.model_latency, "model_jitter": args.model_jitter,
+            "token_latency": args.token_latency, "sheets_latency": args.sheets_latency,
+            "flush_every": args.flush_every,
+        }
+        for pages, dpi, workers, batch_size in itertools.product(args.pages, args.dpi, args.workers, args.batch_size)
+    ]
+
+    pdfs = {}
+    results = []
+    # A fresh process per scenario, so peak RSS and the wrapped stages don't leak between runs
+    context = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        if scenario["pages"] not in pdfs:
+            pdfs[scenario["pages"]] = synthetic_pdf(scenario["pages"], seed=scenario["pages"])
+        pdf_bytes, answers = pdfs[scenario["pages"]]
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_in_process, ((scenario, pdf_bytes, answers),))
+        results.append(result)
+        print(
+            f"pages={result['pages']} dpi={result['dpi']} workers={result['workers']} "
+            f"batch={result['batch_size']}: {result['pages_per_second']} pages/s, "
+            f"peak RSS {result['peak_rss_mb']} MB",
+            file=sys.stderr,
+        )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare_to_baseline(results, json.load(f), args.tolerance)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}", file=sys.stderr)
+
+    if report.get("regressions"):
+        print(json.dumps(report["regressions"], indent=2))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import math
+import re
+from sheets import SECTIONS
+
+# --- Configuration ---
+
+OPTIONS = "ABCD"
+
+# Placeholder for an unanswered or unreadable question in an answer string
+BLANK = "-"
+
+# Text shared by the single-page and batch prompts, built from SECTIONS
+_KEYS = ", ".join(['"Name"', '"Application_No"'] + [f'"{prefix}"' for _, prefix, _ in SECTIONS])
+_LENGTHS = "; ".join(f'"{prefix}" has exactly {count} characters' for _, prefix, count in SECTIONS)
+_ANSWER_RULES = f"""Each of {", ".join(f'"{prefix}"' for _, prefix, _ in SECTIONS)} is a string with one character per question,
+the answers to questions 1, 2, 3, ... of that section in order: {_LENGTHS}.
+Use "{BLANK}" for a question that is unanswered or unclear. Do not add spaces, numbers or separators.
+If the Name or Application No is not found, return an empty string for it."""
+_EXAMPLE = ",\n".join(
+    ['  "Name": "John Doe"', '  "Application_No": "12345"']
+    + [f'  "{prefix}": "' + ("AB" + BLANK + "CD" * count)[:count] + '"' for _, prefix, count in SECTIONS]
+)
+
+# One answer string per section instead of 80 "n": "X" entries
+COMPACT_PROMPT = f"""
+You are an expert OCR (Optical Character Recognition) tool.
+Analyze the provided image of a PhD Written Exam answer script.
+Extract the Name, the Application No, and the handwritten answer (A, B, C, or D) to every question.
+
+Your output **MUST** be a single, valid JSON object with these keys: {_KEYS}.
+{_ANSWER_RULES}
+
+Example JSON structure:
+{{
+{_EXAMPLE}
+}}
+"""
+
+COMPACT_USER_INPUT = "Extract Name, Application No, and one answer string per section as a single JSON object."
+
+COMPACT_BATCH_PROMPT = f"""
+You are an expert OCR (Optical Character Recognition) tool.
+You are given several images, each one page of a PhD Written Exam answer script.
+The page names are listed in the request, in the same order as the images.
+For every page, extract the Name, the Application No, and the handwritten answer (A, B, C, or D) to every question.
+
+Your output **MUST** be a single, valid JSON object whose keys are the page names, with one entry per image.
+Each value is a JSON object with these keys: {_KEYS}.
+{_ANSWER_RULES}
+Never merge pages or skip a page, even if it looks blank.
+"""
+
+
+def decode_answers(answers, count):
+    """
+    Expands an answer string into {"1": "A", ...} for count questions.
+    Short strings are padded with blanks; anything but A-D reads as blank.
+    """
+    answers = answers.upper() if isinstance(answers, str) else ""
+    return {
+        str(i + 1): answers[i] if i < len(answers) and answers[i] in OPTIONS else ""
+        for i in range(count)
+    }
+
+
+def decode_compact(compact):
+    """
+    Turns a compact response into the nested dict build_row expects.
+    A section the model returned as a nested object is kept as it is.
+    """
+    if not isinstance(compact, dict):
+        return compact
+    data_dict = {
+        "Name": compact.get("Name", ""),
+        "Application_No": compact.get("Application_No", ""),
+    }
+    for section, prefix, count in SECTIONS:
+        answers = compact.get(prefix, compact.get(section))
+        if isinstance(answers, dict):
+            data_dict[section] = answers
+        elif isinstance(answers, str):
+            data_dict[section] = decode_answers(answers, count)
+    return data_dict
+
+
+def encode_compact(data_dict):
+    """The compact form of a nested result dict (the inverse of decode_compact)."""
+    compact = {
+        "Name": data_dict.get("Name", ""),
+        "Application_No": data_dict.get("Application_No", ""),
+    }
+    for section, prefix, count in SECTIONS:
+        answers = data_dict.get(section, {})
+        compact[prefix] = "".join(answers.get(str(i), "") or BLANK for i in range(1, count + 1))
+    return compact
+
+
+def approx_tokens(text):
+    """
+    Rough output token count: every punctuation mark is a token and runs
+    of letters or digits take one token per 4 characters. Good enough to
+    compare response formats; not a real tokenizer.
+    """
+    return sum(
+        math.ceil(len(piece) / 4) if piece[0].isalnum() else 1
+        for piece in re.findall(r"\w+|[^\w\s]", text)
+    )
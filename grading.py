@@ -0,0 +1,264 @@
+"""
+Scores the extracted answers in the sheet against answer keys.
+
+Answers are loaded with one bulk read into a candidates x 80 uint8 array
+and scored in a single vectorized pass, with a marking scheme per section
+(including negative marking). Results and per-question statistics are
+written back to their own worksheets with one bulk write each.
+
+Example:
+    python grading.py answer_key.json
+    python grading.py answer_key.json --results-sheet Results --stats-sheet "Question Stats"
+
+The key file holds one or more keys, each an answer string per section
+("-" drops a question), the marking scheme, and optionally which key each
+Application_No was given (the first key is the default):
+
+    {
+      "keys": {"A": {"Quantitative_Aptitude": "ABCD...", "Verbal": "...", "Logical_Reasoning": "..."}},
+      "marking": {"Verbal": {"correct": 2, "wrong": -0.5}},
+      "candidate_keys": {"123456": "A"}
+    }
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from sheets import SECTIONS, ALL_HEADERS, open_spreadsheet, get_or_create_worksheet
+from compact_format import BLANK
+from batch_cli import GOOGLE_SHEET_ID, SERVICE_ACCOUNT_FILE
+
+# --- Configuration ---
+
+OPTIONS = "ABCD"
+
+# Column layout of a sheet row, from ALL_HEADERS
+ANSWERS_START = ALL_HEADERS.index("Application_No") + 1
+QUESTIONS = sum(count for _, _, count in SECTIONS)
+# First column of each section within the 80 answers
+SECTION_STARTS = np.cumsum([0] + [count for _, _, count in SECTIONS[:-1]])
+
+# Marks per question; sections missing from a key file's marking use this
+DEFAULT_MARKING = {"correct": 1.0, "wrong": 0.0, "blank": 0.0}
+
+# Share of candidates in the top and bottom groups of the discrimination index
+DISCRIMINATION_GROUP = 0.27
+
+RESULTS_SHEET = "Results"
+STATS_SHEET = "Question Stats"
+# Rows per update call when writing results, to keep requests a sensible size
+WRITE_CHUNK_ROWS = 20000
+
+# Byte -> option code (A=1 ... D=4); anything else is blank (0)
+_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _option in enumerate(OPTIONS, start=1):
+    _CODES[ord(_option)] = _CODES[ord(_option.lower())] = _code
+
+
+def encode_answer_strings(strings):
+    """
+    Turns answer strings (one character per question, QUESTIONS long) into
+    a len(strings) x QUESTIONS uint8 array of option codes.
+    """
+    joined = "".join(s.ljust(QUESTIONS, BLANK)[:QUESTIONS] for s in strings)
+    codes = _CODES[np.frombuffer(joined.encode("ascii", "replace"), dtype=np.uint8)]
+    return codes.reshape(len(strings), QUESTIONS)
+
+
+def answers_from_rows(rows):
+    """
+    Reads sheet rows (ALL_HEADERS layout, header excluded) into
+    (image_names, application_nos, names, answers array).
+    """
+    rows = [row for row in rows if any(row)]
+    strings = [
+        "".join((cell or BLANK)[:1] for cell in row[ANSWERS_START:ANSWERS_START + QUESTIONS])
+        for row in rows
+    ]
+    image_names = [row[0] if row else "" for row in rows]
+    application_nos = [row[2] if len(row) > 2 else "" for row in rows]
+    names = [row[1] if len(row) > 1 else "" for row in rows]
+    return image_names, application_nos, names, encode_answer_strings(strings)
+
+
+def key_string(key):
+    """An answer key as one QUESTIONS-long string: a string already, or a string per section."""
+    if isinstance(key, str):
+        return key
+    return "".join(key.get(section, "").ljust(count, BLANK)[:count] for section, _, count in SECTIONS)
+
+
+def marking_vectors(marking=None):
+    """Per-question (correct, wrong, blank) marks from a per-section marking scheme."""
+    marking = marking or {}
+    vectors = np.zeros((3, QUESTIONS), dtype=np.float32)
+    for start, (section, _, count) in zip(SECTION_STARTS, SECTIONS):
+        scheme = dict(DEFAULT_MARKING, **marking.get(section, {}))
+        vectors[:, start:start + count] = [[scheme["correct"]], [scheme["wrong"]], [scheme["blank"]]]
+    return vectors
+
+
+def competition_ranks(totals):
+    """1-based ranks, highest total first; ties share a rank ("1224" ranking)."""
+    negated = -totals
+    return np.searchsorted(np.sort(negated), negated, side="left") + 1
+
+
+class Grades:
+    """
+    Scores for every candidate: per-section and total marks, counts of
+    correct/wrong/blank answers, and ranks. Built by grade().
+    """
+
+    def __init__(self, section_scores, correct, wrong, blank, key_of, key_names):
+        self.section_scores = section_scores
+        self.totals = section_scores.sum(axis=1)
+        self.ranks = competition_ranks(self.totals)
+        self.correct = correct
+        self.wrong = wrong
+        self.blank = blank
+        self.key_of = key_of
+        self.key_names = key_names
+
+    def result_rows(self, image_names, application_nos, names):
+        """Header plus one row per candidate, for write-back."""
+        header = ["Image Name", "Name", "Application_No", "Key"]
+        header += [f"{prefix}_Score" for _, prefix, _ in SECTIONS]
+        header += ["Total", "Rank", "Correct", "Wrong", "Blank"]
+        rows = [header]
+        section_scores = self.section_scores.round(2).tolist()
+        totals = self.totals.round(2).tolist()
+        for i, scores in enumerate(section_scores):
+            rows.append(
+                [image_names[i], names[i], application_nos[i], self.key_names[self.key_of[i]]]
+                + scores
+                + [totals[i], int(self.ranks[i]), int(self.correct[i]), int(self.wrong[i]), int(self.blank[i])]
+            )
+        return rows
+
+
+def grade(answers, keys, marking=None, key_of=None, key_names=None):
+    """
+    Scores a candidates x QUESTIONS answers array in one vectorized pass.
+    keys is a keys x QUESTIONS code array (0 drops a question), key_of the
+    key index of each candidate (default: the first key), and marking a
+    per-section scheme like {"Verbal": {"correct": 2, "wrong": -0.5}}.
+    Returns (Grades, correct_mask) where correct_mask is candidates x QUESTIONS.
+    """
+    if key_of is None:
+        key_of = np.zeros(len(answers), dtype=np.intp)
+    key_names = key_names or [str(i) for i in range(len(keys))]
+    correct_marks, wrong_marks, blank_marks = marking_vectors(marking)
+
+    expected = keys[key_of]
+    counted = expected > 0
+    answered = answers > 0
+    is_correct = (answers == expected) & counted
+    is_wrong = answered & ~is_correct & counted
+    is_blank = ~answered & counted
+
+    marks = is_correct * correct_marks + is_wrong * wrong_marks + is_blank * blank_marks
+    section_scores = np.add.reduceat(marks, SECTION_STARTS, axis=1)
+    grades = Grades(
+        section_scores,
+        is_correct.sum(axis=1), is_wrong.sum(axis=1), is_blank.sum(axis=1),
+        key_of, key_names,
+    )
+    return grades, is_correct
+
+
+def question_stats(answers, is_correct, totals, group=DISCRIMINATION_GROUP):
+    """
+    Per-question difficulty statistics: share of candidates who answered,
+    answered correctly (the difficulty index, higher is easier) and answered
+    wrong, how often each option was picked, and the discrimination index
+    (correct rate of the top group minus the bottom group by total).
+    Returns the header plus one row per question.
+    """
+    candidates = max(1, len(answers))
+    answered = (answers > 0).mean(axis=0)
+    correct = is_correct.mean(axis=0)
+    picked = np.stack([(answers == code).mean(axis=0) for code in range(1, len(OPTIONS) + 1)])
+
+    order = np.argsort(-totals, kind="stable")
+    size = max(1, int(round(candidates * group)))
+    discrimination = is_correct[order[:size]].mean(axis=0) - is_correct[order[-size:]].mean(axis=0)
+
+    rows = [["Question", "Answered", "Correct", "Wrong"] + [f"Picked_{o}" for o in OPTIONS] + ["Discrimination"]]
+    question = 0
+    for _, prefix, count in SECTIONS:
+        for i in range(1, count + 1):
+            rows.append(
+                [f"{prefix}_Q{i}", round(float(answered[question]), 4), round(float(correct[question]), 4),
+                 round(float(answered[question] - correct[question]), 4)]
+                + [round(float(p), 4) for p in picked[:, question]]
+                + [round(float(discrimination[question]), 4)]
+            )
+            question += 1
+    return rows
+
+
+def load_key_file(path):
+    """Reads a key file into (keys array, key names, marking, {Application_No: key name})."""
+    with open(path) as f:
+        spec = json.load(f)
+    key_names = list(spec["keys"])
+    keys = encode_answer_strings([key_string(spec["keys"][name]) for name in key_names])
+    return keys, key_names, spec.get("marking", {}), spec.get("candidate_keys", {})
+
+
+def write_rows(worksheet, rows):
+    """
+    Replaces the worksheet contents with rows: the sheet is resized to fit
+    and written in bulk updates of WRITE_CHUNK_ROWS rows.
+    """
+    worksheet.clear()
+    worksheet.resize(rows=len(rows), cols=len(rows[0]))
+    for start in range(0, len(rows), WRITE_CHUNK_ROWS):
+        worksheet.update(rows[start:start + WRITE_CHUNK_ROWS], f"A{start + 1}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score the extracted answers against answer keys.")
+    parser.add_argument("key_file", help="JSON file with the answer keys and marking scheme")
+    parser.add_argument("--sheet-id", default=GOOGLE_SHEET_ID)
+    parser.add_argument("--service-account", default=SERVICE_ACCOUNT_FILE, help="Service account JSON file")
+    parser.add_argument("--results-sheet", default=RESULTS_SHEET, help="Worksheet the scores are written to")
+    parser.add_argument("--stats-sheet", default=STATS_SHEET, help="Worksheet the question statistics are written to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    keys, key_names, marking, candidate_keys = load_key_file(args.key_file)
+
+    spreadsheet = open_spreadsheet(args.sheet_id, service_account_file=args.service_account)
+    answers_sheet = spreadsheet.get_worksheet(0)
+    image_names, application_nos, names, answers = answers_from_rows(answers_sheet.get_all_values()[1:])
+    if not len(answers):
+        print("No answers in the sheet.", file=sys.stderr)
+        return 1
+
+    key_index = {name: i for i, name in enumerate(key_names)}
+    key_of = np.array([key_index.get(candidate_keys.get(a.strip()), 0) for a in application_nos], dtype=np.intp)
+
+    start = time.perf_counter()
+    grades, is_correct = grade(answers, keys, marking, key_of, key_names)
+    stats_rows = question_stats(answers, is_correct, grades.totals)
+    seconds = time.perf_counter() - start
+
+    result_rows = grades.result_rows(image_names, application_nos, names)
+    write_rows(get_or_create_worksheet(spreadsheet, args.results_sheet, len(result_rows), len(result_rows[0])), result_rows)
+    write_rows(get_or_create_worksheet(spreadsheet, args.stats_sheet, len(stats_rows), len(stats_rows[0])), stats_rows)
+    print(json.dumps({
+        "candidates": len(answers),
+        "scoring_seconds": round(seconds, 4),
+        "mean_total": round(float(grades.totals.mean()), 2),
+        "max_total": round(float(grades.totals.max()), 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""
+Durable queue of uploaded PDFs, processed by a pool of worker processes.
+Runs outlive the browser session that started them, and several uploads
+are analyzed at once, each on its own CPU core.
+
+The apps only enqueue uploads and poll their status; they start a worker
+pool of their own. Workers can also run on their own, for example on a
+bigger machine next to the app:
+
+    python job_queue.py --provider gemini --workers 4
+    python job_queue.py --status
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from sheets import open_worksheet, ensure_header_row, SheetWriter, SheetIndex, DEFAULT_FLUSH_EVERY
+from ocr_cache import OcrCache, DEFAULT_CACHE_PATH
+from journal import JobJournal, DEFAULT_JOURNAL_PATH
+from backends import make_backend
+from rate_limit import RateLimiter, split_quota, PROVIDER_LIMITS
+from metrics import RunMetrics
+from pipeline import process_pdf_file
+
+# --- Configuration ---
+
+DEFAULT_QUEUE_PATH = "queue.sqlite3"
+# Uploaded PDFs wait here until a worker has processed them
+DEFAULT_UPLOAD_DIR = "uploads"
+
+DEFAULT_QUEUE_WORKERS = 2
+# Seconds an idle worker waits before looking for a job again
+POLL_INTERVAL = 1.0
+# A running job's worker reports every HEARTBEAT_INTERVAL seconds. Jobs
+# silent for STALE_AFTER seconds (their worker died) are queued again.
+HEARTBEAT_INTERVAL = 10.0
+STALE_AFTER = 60.0
+# A job whose worker has died this many times (e.g. it runs out of memory
+# on the PDF) fails instead of taking down yet another worker
+MAX_ATTEMPTS = 3
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Job options passed on to pipeline.analyze_pdf; "upsert" is handled by the worker
+ANALYZE_OPTIONS = [
+    "profile_name", "max_workers", "batch_size", "response_format", "use_omr", "omr_read_header", "filter_pages",
+]
+
+_JOB_COLUMNS = [
+    "id", "file_name", "pdf_path", "provider", "options", "state", "total_pages", "pages_done",
+    "pages_failed", "error", "result", "worker", "attempts", "created_at", "started_at", "finished_at",
+]
+
+
+class JobQueue:
+    """
+    Queue of PDF jobs in SQLite, shared by the apps and the worker
+    processes. Each job records its state, page progress and result, so
+    any session can poll it. Safe to share between threads; every process
+    opens its own JobQueue on the same file.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, upload_dir=DEFAULT_UPLOAD_DIR):
+        self.path = path
+        self.upload_dir = upload_dir
+        self._lock = threading.Lock()
+        # Workers in other processes hold the write lock briefly; wait for it
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " file_name TEXT NOT NULL,"
+            " pdf_path TEXT NOT NULL,"
+            " provider TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " total_pages INTEGER,"
+            " pages_done INTEGER NOT NULL DEFAULT 0,"
+            " pages_failed INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " result TEXT,"
+            " worker TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " heartbeat_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS queue_jobs_state ON queue_jobs (state, provider, id)")
+        self._conn.commit()
+
+    def enqueue(self, pdf_bytes, file_name, provider, options=None):
+        """
+        Saves the PDF to the upload directory and queues it. Returns the
+        job id. options are the ANALYZE_OPTIONS for the job, plus "upsert".
+        """
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # Unique per job, so a worker can delete its copy when it is done
+        pdf_path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex[:12]}_{os.path.basename(file_name)}")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO queue_jobs (file_name, pdf_path, provider, options, state, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (file_name, pdf_path, provider, json.dumps(options or {}), QUEUED, time.time()),
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def claim(self, worker, provider):
+        """
+        Marks the oldest queued job for this provider as running on this
+        worker and returns it, or returns None if there is none. Safe
+        against workers in other processes claiming at the same time.
+        """
+        now = time.time()
+        with self._lock:
+            # Take the write lock before reading, so no other process claims the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM queue_jobs WHERE state = ? AND provider = ? ORDER BY id LIMIT 1",
+                    (QUEUED, provider),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE queue_jobs SET state = ?, worker = ?, attempts = attempts + 1,"
+                        " started_at = ?, heartbeat_at = ?, error = NULL WHERE id = ?",
+                        (RUNNING, worker, now, now, row[0]),
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def progress(self, job_id, pages_done, pages_failed, total_pages=None):
+        """Records a running job's page counts; this also counts as a heartbeat."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue_jobs SET pages_done = ?, pages_failed = ?,"
+                " total_pages = COALESCE(?, total_pages), heartbeat_at = ? WHERE id = ?",
+                (pages_done, pages_failed, total_pages, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def heartbeat(self, job_id):
+        with self._lock:
+            self._conn.execute("UPDATE queue_jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def finish(self, job_id, result=None):
+        """Marks a job done, with its run statistics."""
+        self._end(job_id, DONE, result=json.dumps(result) if result is not None else None)
+
+    def fail(self, job_id, error):
+        self._end(job_id, FAILED, error=str(error))
+
+    def _end(self, job_id, state, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue_jobs SET state = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (state, result, error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def requeue_stale(self, stale_after=STALE_AFTER, max_attempts=MAX_ATTEMPTS):
+        """
+        Queues running jobs whose worker stopped reporting again. The job
+        journal lets the next worker skip pages already written. Jobs that
+        have already been claimed max_attempts times fail instead, and
+        keep their upload so they can be looked into.
+        Returns the number of jobs requeued.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue_jobs SET state = ?, worker = NULL, finished_at = ?,"
+                " error = 'Worker stopped while running this job ' || attempts || ' times'"
+                " WHERE state = ? AND heartbeat_at < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now - stale_after, max_attempts),
+            )
+            cursor = self._conn.execute(
+                "UPDATE queue_jobs SET state = ?, worker = NULL WHERE state = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, now - stale_after),
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def get(self, job_id):
+        """Returns a job as a dict, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM queue_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return _job_dict(row) if row else None
+
+    def jobs(self, limit=20, job_ids=None):
+        """The most recent jobs (or the given ones), newest first."""
+        sql = f"SELECT {', '.join(_JOB_COLUMNS)} FROM queue_jobs"
+        params = []
+        if job_ids is not None:
+            sql += f" WHERE id IN ({', '.join('?' * len(job_ids))})"
+            params += list(job_ids)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit]).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def counts(self):
+        """Returns {state: number of jobs}."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM queue_jobs GROUP BY state"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _job_dict(row):
+    job = dict(zip(_JOB_COLUMNS, row))
+    job["options"] = json.loads(job["options"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class QueueWorker:
+    """
+    Processes queued jobs one at a time in the current process. The model
+    backend and the worksheet are opened on the first job and reused.
+
+    config holds "provider", "sheet_id" and either "service_account_info"
+    or "service_account_file", and optionally "workers" (the pool size,
+    used to split the API quotas), "limits", "flush_every", "cache" and
+    "journal". API keys come from the environment, as in make_backend.
+    """
+
+    def __init__(self, config, queue_path=DEFAULT_QUEUE_PATH, log=print):
+        self.config = config
+        self.queue = JobQueue(queue_path)
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.log = log
+        self._backend = None
+        self._worksheet = None
+        self._sheets_limiter = None
+        self._ocr_cache = None
+        self._journal = None
+
+    def _open(self):
+        if self._backend is not None:
+            return
+        config = self.config
+        share = config.get("workers", 1)
+        # Everything is opened before any of it is kept, so a failure here
+        # (e.g. a passing Sheets error) is retried in full on the next job
+        backend = make_backend(config["provider"], limits=config.get("limits"), share=share)
+        worksheet = open_worksheet(
+            config["sheet_id"],
+            service_account_info=config.get("service_account_info"),
+            service_account_file=config.get("service_account_file"),
+        )
+        ensure_header_row(worksheet)
+        sheets_limiter = RateLimiter(name="sheets", **split_quota(PROVIDER_LIMITS["sheets"], share))
+        ocr_cache = OcrCache(config.get("cache", DEFAULT_CACHE_PATH))
+        journal = JobJournal(config.get("journal", DEFAULT_JOURNAL_PATH))
+        self._worksheet = worksheet
+        self._sheets_limiter = sheets_limiter
+        self._ocr_cache = ocr_cache
+        self._journal = journal
+        self._backend = backend
+
+    def process(self, job):
+        """Runs one claimed job and records its outcome in the queue."""
+        job_id = job["id"]
+        stop_heartbeat = threading.Event()
+
+        def beat():
+            while not stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+                self.queue.heartbeat(job_id)
+
+        heartbeat = threading.Thread(target=beat, name=f"heartbeat-{job_id}", daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            self._open()
+            options = job["options"]
+            index = SheetIndex.load(self._worksheet, self._sheets_limiter) if options.get("upsert") else None
+            writer = SheetWriter(
+                self._worksheet, flush_every=self.config.get("flush_every", DEFAULT_FLUSH_EVERY),
+                limiter=self._sheets_limiter, index=index,
+            )
+            with RunMetrics() as run_metrics:
+                with writer:
+                    written, failed = process_pdf_file(
+                        job["pdf_path"], self._backend, self._backend.model_name, writer,
+                        log=self.log,
+                        journal=self._journal,
+                        ocr_cache=self._ocr_cache,
+                        on_progress=lambda done, pages_failed, total: self.queue.progress(job_id, done, pages_failed, total),
+                        **{name: options[name] for name in ANALYZE_OPTIONS if name in options},
+                    )
+        except Exception as e:
+            self.log(f"Job {job_id} ({job['file_name']}): failed ({e})")
+            self.queue.fail(job_id, e)
+        else:
+            self.queue.finish(job_id, {
+                "pages_written": written,
+                "pages_failed": failed,
+                "seconds": round(time.perf_counter() - start, 2),
+                "rows_updated": writer.rows_updated,
+                "rows_skipped": writer.rows_skipped,
+                "metrics": run_metrics.summary(),
+            })
+            self.log(f"Job {job_id} ({job['file_name']}): {written} pages written, {failed} failed")
+            # Failed jobs keep their upload so they can be looked into
+            try:
+                os.remove(job["pdf_path"])
+            except OSError:
+                pass
+        finally:
+            stop_heartbeat.set()
+
+    def run(self, stop_event=None, poll_interval=POLL_INTERVAL, exit_when_idle=False):
+        """Processes jobs until stop_event is set (or the queue is empty, with exit_when_idle)."""
+        while stop_event is None or not stop_event.is_set():
+            self.queue.requeue_stale()
+            job = self.queue.claim(self.name, self.config["provider"])
+            if job is not None:
+                self.process(job)
+            elif exit_when_idle:
+                return
+            elif stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+
+def run_worker(config, queue_path=DEFAULT_QUEUE_PATH, parent_pid=None):
+    """
+    Entry point of a worker process started by WorkerPool. SIGTERM stops
+    the worker after its current job, and so does its parent exiting.
+    """
+    stop_event = threading.Event()
+    # Ctrl+C reaches the whole process group; the pool decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    def watch_parent():
+        while not stop_event.wait(POLL_INTERVAL):
+            if os.getppid() != parent_pid:
+                stop_event.set()
+
+    if parent_pid is not None:
+        threading.Thread(target=watch_parent, name="watch-parent", daemon=True).start()
+    QueueWorker(config, queue_path).run(stop_event)
+
+
+class WorkerPool:
+    """
+    Starts workers worker processes (each a QueueWorker) and keeps them
+    running. Workers are started as "python job_queue.py --worker", with
+    the config sent as JSON on stdin, rather than with multiprocessing:
+    under Streamlit the app script is the __main__ module, which spawned
+    processes would run again.
+    """
+
+    def __init__(self, config, workers=DEFAULT_QUEUE_WORKERS, queue_path=DEFAULT_QUEUE_PATH):
+        self.config = dict(config, workers=workers)
+        self.workers = workers
+        self.queue_path = queue_path
+        self._processes = []
+
+    def start(self):
+        """Starts missing or dead workers. Returns the pool."""
+        self._processes = [p for p in self._processes if p.poll() is None]
+        while len(self._processes) < self.workers:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--worker",
+                 "--queue", self.queue_path, "--parent-pid", str(os.getpid())],
+                stdin=subprocess.PIPE,
+            )
+            process.stdin.write(json.dumps(self.config).encode("utf-8"))
+            process.stdin.close()
+            self._processes.append(process)
+        return self
+
+    def alive(self):
+        return sum(p.poll() is None for p in self._processes)
+
+    def stop(self, timeout=None):
+        """Asks the workers to stop after their current job and waits for them."""
+        for process in self._processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self._processes:
+            process.wait(timeout)
+
+
+def parse_args(argv=None):
+    # Same sheet the apps and batch_cli.py write to
+    from batch_cli import GOOGLE_SHEET_ID, SERVICE_ACCOUNT_FILE
+
+    parser = argparse.ArgumentParser(description="Run worker processes for the PDF job queue.")
+    parser.add_argument("--provider", default="gemini",
+                        help="Process jobs queued for this provider (gemini or groq, as in batch_cli.py)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_QUEUE_WORKERS, help="Worker processes")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Job queue file")
+    parser.add_argument("--sheet-id", default=GOOGLE_SHEET_ID)
+    parser.add_argument("--service-account", default=SERVICE_ACCOUNT_FILE, help="Service account JSON file")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="OCR cache file")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH, help="Job journal file used to resume jobs")
+    parser.add_argument("--status", action="store_true", help="Print the most recent jobs and exit")
+    # Used by WorkerPool: run one worker with the JSON config read from stdin
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--parent-pid", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    if args.worker:
+        run_worker(json.load(sys.stdin), args.queue, args.parent_pid)
+        return 0
+
+    if args.status:
+        job_queue = JobQueue(args.queue)
+        print(json.dumps({"counts": job_queue.counts(), "jobs": job_queue.jobs()}, indent=2))
+        return 0
+
+    pool = WorkerPool({
+        "provider": args.provider,
+        "sheet_id": args.sheet_id,
+        "service_account_file": args.service_account,
+        "cache": args.cache,
+        "journal": args.journal,
+    }, workers=args.workers, queue_path=args.queue).start()
+    print(f"Started {args.workers} {args.provider} workers on {args.queue}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            # Replace workers that crashed
+            pool.start()
+    except KeyboardInterrupt:
+        print("Stopping workers after their current job...")
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
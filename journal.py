@@ -0,0 +1,163 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# --- Configuration ---
+
+DEFAULT_JOURNAL_PATH = "jobs.sqlite3"
+
+# Page states, in the order a page moves through them
+RENDERED = "rendered"
+OCR_DONE = "ocr"
+PARSED = "parsed"
+WRITTEN = "written"
+FAILED = "failed"
+# Kept away from the model by the page filter (blank, cover or instruction pages)
+SKIPPED = "skipped"
+
+
+def job_id_for(pdf_bytes, file_name):
+    """
+    Jobs are identified by the PDF contents and file name, so uploading
+    the same PDF again resumes the earlier job.
+    """
+    digest = hashlib.sha256(pdf_bytes).hexdigest()[:16]
+    return f"{file_name}:{digest}"
+
+
+class JobJournal:
+    """
+    Durable per-page status journal in SQLite. Records each page's state and
+    raw model response, so a failed or interrupted job can resume, retrying
+    only the pages that did not finish and skipping pages already written.
+    Safe to share between the OCR worker threads.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " file_name TEXT NOT NULL,"
+            " total_pages INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " job_id TEXT NOT NULL,"
+            " image_name TEXT NOT NULL,"
+            " page_num INTEGER NOT NULL,"
+            " state TEXT NOT NULL,"
+            " raw_response TEXT,"
+            " data TEXT,"
+            " error TEXT,"
+            " updated_at REAL NOT NULL,"
+            " filter_decision TEXT,"
+            " PRIMARY KEY (job_id, image_name))"
+        )
+        # Journals created before pages recorded the page filter's decision
+        existing = [column[1] for column in self._conn.execute("PRAGMA table_info(pages)")]
+        if "filter_decision" not in existing:
+            self._conn.execute("ALTER TABLE pages ADD COLUMN filter_decision TEXT")
+        self._conn.commit()
+
+    def start_job(self, pdf_bytes, file_name, total_pages):
+        """Creates the job if it is new and returns its id."""
+        job_id = job_id_for(pdf_bytes, file_name)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, file_name, total_pages, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (job_id, file_name, total_pages, now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def reset_job(self, job_id):
+        """Forgets every page recorded for a job, so it runs again from the first page."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def pending_pages(self, job_id, total_pages):
+        """Returns the page numbers (1-based) not yet written to the sheet."""
+        with self._lock:
+            written = {
+                row[0] for row in self._conn.execute(
+                    "SELECT page_num FROM pages WHERE job_id = ? AND state = ?", (job_id, WRITTEN)
+                )
+            }
+        return [n for n in range(1, total_pages + 1) if n not in written]
+
+    def parsed_data(self, job_id, image_name):
+        """Returns the parsed dict recorded for a page, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM pages WHERE job_id = ? AND image_name = ? AND data IS NOT NULL",
+                (job_id, image_name),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def mark(self, job_id, image_name, page_num, state, raw_response=None, data_dict=None, error=None):
+        """
+        Records a page's new state. Raw responses and parsed data are kept
+        from earlier states unless new values are given.
+        """
+        data = json.dumps(data_dict) if data_dict is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pages (job_id, image_name, page_num, state, raw_response, data, error, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(job_id, image_name) DO UPDATE SET"
+                " state = excluded.state,"
+                " raw_response = COALESCE(excluded.raw_response, raw_response),"
+                " data = COALESCE(excluded.data, data),"
+                " error = excluded.error,"
+                " updated_at = excluded.updated_at",
+                (job_id, image_name, page_num, state, raw_response, data, error, time.time()),
+            )
+            self._conn.commit()
+
+    def record_filter_decision(self, job_id, image_name, page_num, decision):
+        """
+        Records the page filter's decision about a page, kept or skipped,
+        without changing the state of a page already further along.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pages (job_id, image_name, page_num, state, filter_decision, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(job_id, image_name) DO UPDATE SET"
+                " filter_decision = excluded.filter_decision,"
+                " updated_at = excluded.updated_at",
+                (job_id, image_name, page_num, RENDERED, json.dumps(decision), time.time()),
+            )
+            self._conn.commit()
+
+    def mark_written(self, job_id, image_name):
+        """Marks a page as written to the sheet."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET state = ?, error = NULL, updated_at = ? WHERE job_id = ? AND image_name = ?",
+                (WRITTEN, time.time(), job_id, image_name),
+            )
+            self._conn.commit()
+
+    def summary(self, job_id):
+        """Returns {state: page count} for a job."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM pages WHERE job_id = ? GROUP BY state", (job_id,)
+            ))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
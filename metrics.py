@@ -0,0 +1,213 @@
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+# --- Configuration ---
+
+# Stages timed by the pipeline, in the order a page goes through them
+STAGES = ["rasterize", "filter", "encode", "base64", "rate_limit_wait", "ocr", "parse", "write"]
+
+PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+PROMETHEUS_PREFIX = "answer_scripts"
+
+# Collectors recording in the current context. Threads the pipeline starts
+# run in a copy of their caller's context, so a run only records its own
+# pages. Spans are cheap no-ops when there are none.
+_active = contextvars.ContextVar("run_metrics", default=())
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RunMetrics:
+    """
+    Collects stage timings, token usage and counters for one run. Use it as
+    a context manager (or call start and stop) to make it record everything
+    the pipeline reports, from any thread, until the run ends:
+
+        with RunMetrics() as run_metrics:
+            ... process pages ...
+        run_metrics.summary()
+
+    A collector records what happens in the context it was started in,
+    including the pipeline's worker threads, which run in a copy of it.
+    Runs at the same time in one process (e.g. two Streamlit sessions)
+    each see only their own spans. Work in threads no run started, like
+    the background sheet sync, is not recorded.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._durations = {}
+        self._tokens = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.time()
+        self.finished_at = None
+        _active.set(_active.get() + (self,))
+        return self
+
+    def stop(self):
+        _active.set(tuple(run_metrics for run_metrics in _active.get() if run_metrics is not self))
+        # Threads still running in a copied context stop recording too
+        self.finished_at = time.time()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def record_span(self, stage, seconds):
+        with self._lock:
+            self._durations.setdefault(stage, []).append(seconds)
+            self.events.append({"type": "span", "stage": stage, "seconds": round(seconds, 6), "at": time.time()})
+
+    def record_usage(self, model, input_tokens, output_tokens):
+        with self._lock:
+            totals = self._tokens.setdefault(model, {"requests": 0, "input_tokens": 0, "output_tokens": 0})
+            totals["requests"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            self.events.append({
+                "type": "usage", "model": model, "input_tokens": input_tokens,
+                "output_tokens": output_tokens, "at": time.time(),
+            })
+
+    def record_page_filter(self, image_name, decision):
+        with self._lock:
+            self.events.append({
+                "type": "page_filter", "image_name": image_name, "keep": decision["keep"],
+                "reason": decision["reason"], "ink": decision["ink"],
+                "grid_score": decision["grid_score"], "at": time.time(),
+            })
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self):
+        """
+        Per-stage count, total and percentiles (milliseconds), token totals
+        per model and per page, and counters.
+        """
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            tokens = {model: dict(totals) for model, totals in self._tokens.items()}
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage in STAGES + sorted(set(durations) - set(STAGES)):
+            values = durations.get(stage)
+            if not values:
+                continue
+            stages[stage] = {
+                "count": len(values),
+                "total_ms": round(sum(values) * 1000, 1),
+                "mean_ms": round(sum(values) * 1000 / len(values), 2),
+                **{f"p{int(p * 100)}_ms": round(percentile(values, p) * 1000, 2) for p in PERCENTILES},
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+
+        pages = counters.get("pages", 0)
+        input_tokens = sum(t["input_tokens"] for t in tokens.values())
+        output_tokens = sum(t["output_tokens"] for t in tokens.values())
+        return {
+            "seconds": round((self.finished_at or time.time()) - self.started_at, 2),
+            "stages": stages,
+            "tokens": {
+                "by_model": tokens,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "input_tokens_per_page": round(input_tokens / pages, 1) if pages else 0.0,
+                "output_tokens_per_page": round(output_tokens / pages, 1) if pages else 0.0,
+            },
+            "counters": counters,
+        }
+
+    def to_json_lines(self):
+        """Every recorded span and usage event, one JSON object per line."""
+        with self._lock:
+            events = list(self.events)
+        return "".join(json.dumps(event) + "\n" for event in events)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """The run summary in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+        for stage in summary["stages"]:
+            values = durations[stage]
+            for p in PERCENTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{p}"}} {percentile(values, p):.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+
+        lines += [
+            f"# HELP {prefix}_tokens_total Model tokens used.",
+            f"# TYPE {prefix}_tokens_total counter",
+        ]
+        for model, totals in summary["tokens"]["by_model"].items():
+            for kind in ("input", "output"):
+                lines.append(f'{prefix}_tokens_total{{model="{model}",kind="{kind}"}} {totals[f"{kind}_tokens"]}')
+
+        lines += [
+            f"# HELP {prefix}_events_total Pages and other events counted during the run.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in summary["counters"].items():
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def active_collectors():
+    """The collectors recording in the current context."""
+    return [run_metrics for run_metrics in _active.get() if run_metrics.finished_at is None]
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Times the enclosed block as one call of stage, for every active collector."""
+    if not _active.get():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        for run_metrics in active_collectors():
+            run_metrics.record_span(stage, seconds)
+
+
+def record_usage(model, input_tokens, output_tokens):
+    """Records the token usage a model response reported."""
+    for run_metrics in active_collectors():
+        run_metrics.record_usage(model, int(input_tokens or 0), int(output_tokens or 0))
+
+
+def record_page_filter(image_name, decision):
+    """Records the page filter's decision (kept or not) about a page."""
+    for run_metrics in active_collectors():
+        run_metrics.record_page_filter(image_name, decision)
+
+
+def increment(name, amount=1):
+    for run_metrics in active_collectors():
+        run_metrics.increment(name, amount)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# --- Configuration ---
+
+DEFAULT_CACHE_PATH = "ocr_cache.sqlite3"
+# Least recently used entries are evicted once the cache grows past this size
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(image_bytes, model_name, prompt):
+    """
+    Builds the cache key for a page: the hash of the rendered page bytes,
+    the model name and the hash of the prompt.
+    """
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return f"{image_hash}:{model_name}:{prompt_hash}"
+
+
+class OcrCache:
+    """
+    Persistent SQLite cache of parsed OCR results with size-based LRU eviction.
+    Safe to share between the OCR worker threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        """Returns the cached dict for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, data_dict):
+        """Stores a parsed result, evicting old entries if the cache is full."""
+        value = json.dumps(data_dict)
+        size = len(value)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total_bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Caller holds the lock
+        if self._total_bytes <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if self._total_bytes <= self.max_bytes:
+                break
+            stale.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def get_or_compute(self, image_bytes, model_name, prompt, compute):
+        """
+        Returns the cached result for this page, model and prompt, or calls
+        compute() and caches what it returns. Empty results are not cached,
+        and exceptions from compute() propagate.
+        """
+        key = cache_key(image_bytes, model_name, prompt)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        data_dict = compute()
+        if data_dict:
+            self.put(key, data_dict)
+        return data_dict
+
+    def stats(self):
+        """Returns hit/miss counts for this instance and the size of the cache."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total_bytes = self._total_bytes
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
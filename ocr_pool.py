@@ -0,0 +1,73 @@
+import concurrent.futures
+import contextvars
+
+# --- Configuration ---
+
+# Default number of pages sent to the model at the same time.
+DEFAULT_MAX_WORKERS = 4
+
+
+def map_pages_in_order(worker, pages, max_workers=DEFAULT_MAX_WORKERS, on_page_done=None):
+    """
+    Runs worker(image_name, image_data) for every page on a bounded thread pool.
+
+    At most max_workers pages are in flight at once. Results are yielded in
+    page order as (image_name, image_data, result, error) tuples, where error
+    is the exception raised by the worker (or None). on_page_done(done_count)
+    is called from the calling thread each time any page finishes, so it is
+    safe to update Streamlit widgets from it.
+    """
+    max_workers = max(1, int(max_workers))
+    # Pages submitted but not yet yielded. Keeping this bounded means a slow
+    # first page cannot make us pull the whole document into memory.
+    window = max_workers * 2
+
+    pages = iter(pages)
+    pending = {}   # future -> page index
+    finished = {}  # page index -> (image_name, image_data, result, error)
+    submitted = {} # page index -> (image_name, image_data)
+    next_to_yield = 0
+    next_index = 0
+    done_count = 0
+    exhausted = False
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            # Top up the window with new pages
+            while not exhausted and next_index - next_to_yield < window:
+                try:
+                    image_name, image_data = next(pages)
+                except StopIteration:
+                    exhausted = True
+                    break
+                # Each page runs in a copy of the caller's context, so run metrics follow it
+                future = executor.submit(contextvars.copy_context().run, worker, image_name, image_data)
+                pending[future] = next_index
+                submitted[next_index] = (image_name, image_data)
+                next_index += 1
+
+            if not pending and next_to_yield == next_index:
+                break
+
+            if pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    index = pending.pop(future)
+                    image_name, image_data = submitted.pop(index)
+                    error = future.exception()
+                    result = None if error else future.result()
+                    finished[index] = (image_name, image_data, result, error)
+                    done_count += 1
+                    if on_page_done:
+                        on_page_done(done_count)
+
+            # Hand back everything that is ready, in page order
+            while next_to_yield in finished:
+                yield finished.pop(next_to_yield)
+                next_to_yield += 1
+    finally:
+        # If the caller stops early, drop queued pages instead of paying for them
+        executor.shutdown(wait=True, cancel_futures=True)
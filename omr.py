@@ -0,0 +1,200 @@
+import hashlib
+import io
+import json
+import numpy as np
+from PIL import Image
+from sheets import SECTIONS
+from template import GRID_BOXES, place_in_regions
+
+# --- Configuration ---
+
+OPTIONS = "ABCD"
+
+# The grid boxes come from template.GRID_BOXES
+GRID_TEMPLATE = [
+    {"section": section, "questions": count, "options": OPTIONS, "box": GRID_BOXES[section]}
+    for section, _, count in SECTIONS
+]
+
+# Fraction of the page the grid search may extend past the template box
+SEARCH_MARGIN = 0.03
+# Fraction of each cell ignored on every side, so cell borders don't count as ink
+CELL_MARGIN = 0.2
+# Ink above the page background for a bubble to count as filled
+FILL_THRESHOLD = 0.25
+# Answers below this confidence are sent to the model
+MIN_CONFIDENCE = 0.5
+
+FALLBACK_USER_INPUT = "Extract the requested fields as a single JSON object."
+
+
+def template_fingerprint(template=GRID_TEMPLATE):
+    """
+    Short hash of the grid template and the OMR thresholds, so cached OMR
+    readings aren't reused once either is recalibrated.
+    """
+    settings = [template, SEARCH_MARGIN, CELL_MARGIN, FILL_THRESHOLD, MIN_CONFIDENCE]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def page_to_ink(image_bytes):
+    """
+    Decodes a rendered page into a float32 array of ink density,
+    0.0 for white paper and 1.0 for black.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        gray = np.asarray(img.convert("L"), dtype=np.float32)
+    return 1.0 - gray / 255.0
+
+
+def locate_grid(ink, box, search_margin=SEARCH_MARGIN):
+    """
+    Finds the pixel bounds (left, top, right, bottom) of a ruled answer grid
+    near its template box, using the row and column ink profiles to snap
+    to the grid's outer border lines.
+    """
+    height, width = ink.shape
+    left = max(0, int((box[0] - search_margin) * width))
+    top = max(0, int((box[1] - search_margin) * height))
+    right = min(width, int((box[2] + search_margin) * width))
+    bottom = min(height, int((box[3] + search_margin) * height))
+    region = ink[top:bottom, left:right]
+
+    def snap(profile, expected_start, expected_end):
+        # Lines holding clearly more ink than the rest of the search window.
+        # Each edge snaps to the line nearest where the template expects it,
+        # so a neighbouring grid's border inside the window is ignored.
+        active = np.flatnonzero(profile > profile.min() + 0.5 * (profile.max() - profile.min()))
+        if active.size == 0:
+            return expected_start, expected_end
+        start = active[np.argmin(np.abs(active - expected_start))]
+        end = active[np.argmin(np.abs(active - expected_end))]
+        return int(start), int(end) + 1
+
+    row_start, row_end = snap(region.mean(axis=1), int(box[1] * height) - top, int(box[3] * height) - top)
+    col_start, col_end = snap(region.mean(axis=0), int(box[0] * width) - left, int(box[2] * width) - left)
+    return left + col_start, top + row_start, left + col_end, top + row_end
+
+
+def measure_fill(ink, bounds, questions, options, cell_margin=CELL_MARGIN):
+    """
+    Returns a (questions, options) array with the mean ink inside each
+    bubble of the grid, computed in one vectorized pass.
+    """
+    left, top, right, bottom = bounds
+    n_options = len(options)
+    # Float pitches, so rounding doesn't drift across 30 rows of cells
+    pitch_h = (bottom - top) / questions
+    pitch_w = (right - left) / n_options
+    if pitch_h < 3 or pitch_w < 3:
+        return np.zeros((questions, n_options), dtype=np.float32)
+
+    # Pixel rows/columns inside each cell, skipping the margin next to its borders
+    offsets_h = np.linspace(cell_margin, 1.0 - cell_margin, max(1, int(pitch_h * (1.0 - 2 * cell_margin))))
+    offsets_w = np.linspace(cell_margin, 1.0 - cell_margin, max(1, int(pitch_w * (1.0 - 2 * cell_margin))))
+    rows = (top + (np.arange(questions)[:, None] + offsets_h) * pitch_h).astype(int)
+    cols = (left + (np.arange(n_options)[:, None] + offsets_w) * pitch_w).astype(int)
+
+    # (questions, rows per cell, options, columns per cell)
+    cells = ink[rows[:, :, None, None], cols[None, None, :, :]]
+    return cells.mean(axis=(1, 3))
+
+
+def score_answers(fill, options, fill_threshold=FILL_THRESHOLD):
+    """
+    Picks the marked option for every question and scores how sure we are.
+    Returns (answers, confidence) where answers holds the option letter or
+    "" for a blank question, and confidence is between 0 and 1.
+    """
+    # Most bubbles are empty, so the median is the paper/print background
+    fill = fill - np.median(fill)
+    order = np.argsort(fill, axis=1)
+    rows = np.arange(fill.shape[0])
+    top = fill[rows, order[:, -1]]
+    second = fill[rows, order[:, -2]]
+
+    marked = top >= fill_threshold
+    letters = np.array(list(options))
+    answers = np.where(marked, letters[order[:, -1]], "")
+
+    # Marked: how clearly the top bubble beats the runner-up.
+    # Blank: how far the darkest bubble stays below half the threshold,
+    # so faint or erased marks are treated as unclear rather than blank.
+    marked_conf = (top - second) / np.maximum(top, 1e-6)
+    blank_conf = 1.0 - top / (fill_threshold / 2)
+    confidence = np.clip(np.where(marked, marked_conf, blank_conf), 0.0, 1.0)
+    return answers, confidence
+
+
+def cropped_template(regions, template=GRID_TEMPLATE):
+    """The template with its boxes moved to where they land on a page cropped to regions."""
+    return [dict(grid, box=place_in_regions(grid["box"], regions)) for grid in template]
+
+
+def read_answers(image_bytes, template=GRID_TEMPLATE, min_confidence=MIN_CONFIDENCE):
+    """
+    Reads every answer grid on a page locally.
+    Returns (data_dict, uncertain) where data_dict has the same section
+    layout the model returns and uncertain maps each section to the
+    question numbers whose confidence is below min_confidence.
+    """
+    ink = page_to_ink(image_bytes)
+    data_dict = {}
+    uncertain = {}
+    for grid in template:
+        bounds = locate_grid(ink, grid["box"])
+        fill = measure_fill(ink, bounds, grid["questions"], grid["options"])
+        answers, confidence = score_answers(fill, grid["options"])
+        data_dict[grid["section"]] = {str(i + 1): str(answer) for i, answer in enumerate(answers)}
+        low = np.flatnonzero(confidence < min_confidence) + 1
+        if low.size:
+            uncertain[grid["section"]] = [str(q) for q in low]
+    return data_dict, uncertain
+
+
+def build_fallback_prompt(uncertain):
+    """
+    Builds a short prompt asking the model only for the handwritten
+    Name/Application No and the answers OMR could not read confidently.
+    """
+    prompt = """
+You are an expert OCR (Optical Character Recognition) tool.
+Analyze the provided image of a PhD Written Exam answer script.
+Your output **MUST** be a single, valid JSON object with the keys "Name" and "Application_No"
+holding the name and application number written on the script."""
+    if uncertain:
+        questions = "\n".join(
+            f"- {section}: questions {', '.join(numbers)}" for section, numbers in uncertain.items()
+        )
+        prompt += f"""
+Also read the marked option (A, B, C, or D) for only these questions:
+{questions}
+Add one key per section listed above whose value is a nested JSON object
+where the keys are the question numbers (as strings) and the values are the marked options."""
+    prompt += "\nIf a value is not found or is unclear, return an empty string for that field/question.\n"
+    return prompt
+
+
+def read_page_with_omr(image_bytes, ask_model, template=GRID_TEMPLATE,
+                       min_confidence=MIN_CONFIDENCE, read_header=True):
+    """
+    Reads the answers locally and only asks the model for what OMR can't do.
+    ask_model(prompt) must return the parsed JSON dict for this page.
+    With read_header=False, pages where every answer was read confidently
+    skip the model entirely and leave Name and Application_No blank.
+    Returns a dict in the same shape as a full model response.
+    """
+    data_dict, uncertain = read_answers(image_bytes, template, min_confidence)
+    data_dict["Name"] = ""
+    data_dict["Application_No"] = ""
+    if not uncertain and not read_header:
+        return data_dict
+
+    model_dict = ask_model(build_fallback_prompt(uncertain)) or {}
+    data_dict["Name"] = model_dict.get("Name", "")
+    data_dict["Application_No"] = model_dict.get("Application_No", "")
+    for section, numbers in uncertain.items():
+        answers = model_dict.get(section, {})
+        for number in numbers:
+            data_dict[section][number] = answers.get(number, "")
+    return data_dict
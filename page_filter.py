@@ -0,0 +1,108 @@
+import numpy as np
+from omr import GRID_TEMPLATE, SEARCH_MARGIN
+
+# --- Configuration ---
+
+# Pages are classified on a copy shrunk so its long side is at most this many pixels
+FILTER_SIZE = 800
+# A pixel is ink when darker than this (0-255)
+INK_LEVEL = 128
+# Pages with a smaller share of ink pixels are blank (scanner noise and show-through stay below it)
+BLANK_INK = 0.003
+# A row (or column) of a strip is part of a ruled line when it is this much darker than the paper
+LINE_DARKNESS = 0.3
+# Ruled lines are at most this many pixels thick on the shrunk page; text rows are thicker
+MAX_LINE_WIDTH = 4
+# Grids are measured in this many strips each way, so a slightly skewed scan still shows straight lines
+STRIPS = 16
+# Share of each grid's expected ruled lines that must be found for the page to be an answer script
+MIN_GRID_SCORE = 0.6
+
+# Decisions
+ANSWER_SHEET = "answer sheet"
+BLANK = "blank"
+NO_GRID = "no answer grid"
+
+
+def shrink(img, size=FILTER_SIZE):
+    """
+    The page as a float32 darkness array (0.0 white, 1.0 black), at most
+    size pixels long.
+    """
+    factor = max(1, max(img.size) // size)
+    if factor > 1:
+        img = img.reduce(factor)
+    return 1.0 - np.asarray(img.convert("L"), dtype=np.float32) / 255.0
+
+
+def count_lines(profile, threshold=LINE_DARKNESS, max_width=MAX_LINE_WIDTH):
+    """Number of thin runs of the profile above threshold, i.e. ruled lines."""
+    above = np.concatenate([[False], profile > threshold, [False]])
+    edges = np.flatnonzero(above[1:] != above[:-1])
+    widths = edges[1::2] - edges[::2]
+    return int(np.count_nonzero(widths <= max_width))
+
+
+def grid_lines(region, axis, strips=STRIPS):
+    """
+    Ruled lines across a region: along rows (axis=1) or columns (axis=0).
+    The region is cut into strips across the lines and the median count
+    is taken, so skew, bubbles and handwriting in one strip don't matter.
+    """
+    counts = [
+        count_lines(strip.mean(axis=axis))
+        for strip in np.array_split(region, strips, axis=axis)
+        if strip.size
+    ]
+    return float(np.median(counts)) if counts else 0.0
+
+
+def grid_score(ink, template=GRID_TEMPLATE, search_margin=SEARCH_MARGIN):
+    """
+    How much of the answer grids' ruling is where the template expects it:
+    for each grid, the share of its question and option lines found in its
+    box, averaged over the grids. A box with far more lines than its grid
+    (e.g. lines of text) scores 0.
+    """
+    height, width = ink.shape
+    scores = []
+    for grid in template:
+        box = grid["box"]
+        left = max(0, int((box[0] - search_margin) * width))
+        top = max(0, int((box[1] - search_margin) * height))
+        right = min(width, int((box[2] + search_margin) * width))
+        bottom = min(height, int((box[3] + search_margin) * height))
+        # Question lines span the box's width and option lines its height;
+        # the search margin only lets the box drift
+        rows = grid_lines(ink[top:bottom, int(box[0] * width):int(box[2] * width)], axis=1)
+        cols = grid_lines(ink[int(box[1] * height):int(box[3] * height), left:right], axis=0)
+        expected_rows = grid["questions"] + 1
+        expected_cols = len(grid["options"]) + 1
+        if rows > 2 * expected_rows or cols > 2 * expected_cols:
+            scores.append(0.0)
+        else:
+            scores.append(min(1.0, rows / expected_rows) * min(1.0, cols / expected_cols))
+    return float(np.mean(scores)) if scores else 0.0
+
+
+def classify_page(img):
+    """
+    Decides from the rendered page whether it is worth sending to the
+    model. Blank pages (almost no ink) and pages without the answer grids
+    (covers, instructions) are skipped. Returns a dict with "keep",
+    "reason", the page's "ink" share and its "grid_score".
+    """
+    darkness = shrink(img)
+    ink = float(np.count_nonzero(darkness > 1.0 - INK_LEVEL / 255.0)) / darkness.size
+    decision = {"keep": False, "reason": BLANK, "ink": round(ink, 4), "grid_score": 0.0}
+    if ink < BLANK_INK:
+        return decision
+    # Darkness above the paper, so grey scans and white renders compare alike
+    decision["grid_score"] = round(grid_score(darkness - np.median(darkness)), 3)
+    if decision["grid_score"] < MIN_GRID_SCORE:
+        decision["reason"] = NO_GRID
+        return decision
+    decision["keep"] = True
+    decision["reason"] = ANSWER_SHEET
+    return decision
+
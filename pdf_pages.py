@@ -0,0 +1,263 @@
+import base64
+import contextvars
+import io
+import os
+import queue
+import tempfile
+import threading
+import time
+from PIL import Image
+from metrics import span
+from template import HEADER_BOX, GRID_BOXES, bounding_box
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+
+# --- Configuration ---
+
+# Pages rendered per pdftoppm call. Only this many rendered pages sit on disk at once.
+DEFAULT_CHUNK_SIZE = 4
+# Threads pdftoppm uses to render a chunk
+DEFAULT_THREAD_COUNT = 2
+# Encoded pages kept ready ahead of the OCR workers
+DEFAULT_PREFETCH = 4
+
+# Margin kept around the template's answer grids when cropping, as a
+# fraction of the page, since scans drift
+REGION_MARGIN = 0.03
+# The header and one crop around all the answer grids (so they keep their
+# layout); the page margins and the band between them are dropped
+TEMPLATE_REGIONS = [
+    HEADER_BOX,
+    bounding_box(GRID_BOXES.values(), REGION_MARGIN),
+]
+
+# Encoding profiles. "dpi" is the render resolution, "grayscale" renders a
+# single channel, "threshold" binarizes to black and white, "format" and
+# "quality" control the image file, and "regions" crops to TEMPLATE_REGIONS.
+ENCODE_PROFILES = {
+    "original": {"dpi": 200, "format": "PNG"},
+    "gray_png": {"dpi": 150, "grayscale": True, "format": "PNG"},
+    "binary_png": {"dpi": 150, "grayscale": True, "threshold": 160, "format": "PNG"},
+    "gray_jpeg": {"dpi": 150, "grayscale": True, "format": "JPEG", "quality": 80},
+    "gray_webp": {"dpi": 150, "grayscale": True, "format": "WEBP", "quality": 75},
+    "regions_jpeg": {"dpi": 150, "grayscale": True, "format": "JPEG", "quality": 80, "regions": TEMPLATE_REGIONS},
+}
+DEFAULT_PROFILE = "original"
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def count_pdf_pages(pdf_bytes):
+    """
+    Returns the number of pages in the PDF without rendering it.
+    Raises if Poppler is not installed or the PDF cannot be read.
+    """
+    return int(pdfinfo_from_bytes(pdf_bytes)["Pages"])
+
+
+def crop_regions(img, regions):
+    """
+    Crops each (left, top, right, bottom) fractional region out of the
+    page and stacks them vertically into a single image.
+    """
+    width, height = img.size
+    crops = [
+        img.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+        for left, top, right, bottom in regions
+    ]
+    stacked = Image.new(img.mode, (max(c.width for c in crops), sum(c.height for c in crops)), "white")
+    y = 0
+    for crop in crops:
+        stacked.paste(crop, (0, y))
+        y += crop.height
+    return stacked
+
+
+def encode_page(img, profile=None):
+    """
+    Converts a PIL Image into the image_parts list the models read,
+    applying the cropping, colour and file format of the encoding profile.
+    """
+    if profile is None:
+        profile = ENCODE_PROFILES[DEFAULT_PROFILE]
+
+    if profile.get("regions"):
+        img = crop_regions(img, profile["regions"])
+    if profile.get("threshold"):
+        threshold = profile["threshold"]
+        img = img.convert("L").point(lambda v: 255 if v >= threshold else 0, mode="1")
+    elif profile.get("grayscale"):
+        img = img.convert("L")
+
+    file_format = profile.get("format", "PNG")
+    save_options = {}
+    if "quality" in profile:
+        save_options["quality"] = profile["quality"]
+
+    with io.BytesIO() as buf:
+        img.save(buf, format=file_format, **save_options)
+        img_bytes = buf.getvalue()
+
+    return [{
+        "mime_type": MIME_TYPES[file_format],
+        "data": img_bytes
+    }]
+
+
+def page_image_name(file_name, page_num):
+    """Name used for a page in the sheet, e.g. "scripts.pdf_page_3"."""
+    return f"{file_name}_page_{page_num}"
+
+
+def page_ranges(page_numbers, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Groups page numbers into (first_page, last_page) runs of consecutive
+    pages, each at most chunk_size long.
+    """
+    ranges = []
+    for page_num in sorted(page_numbers):
+        if ranges and page_num == ranges[-1][1] + 1 and page_num - ranges[-1][0] < chunk_size:
+            ranges[-1][1] = page_num
+        else:
+            ranges.append([page_num, page_num])
+    return [tuple(r) for r in ranges]
+
+
+def iter_pdf_pages(pdf_bytes, file_name, total_pages=None, profile=None, page_numbers=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, thread_count=DEFAULT_THREAD_COUNT,
+                   page_filter=None, on_decision=None):
+    """
+    Renders the PDF a chunk of pages at a time and yields
+    (image_name, image_parts) for each page as soon as it is encoded.
+    Rendered pages go to a temporary folder and are deleted once encoded,
+    so memory stays bounded regardless of document length.
+    page_numbers limits rendering to those pages (1-based), e.g. when resuming.
+    page_filter(img) -> decision dict is asked about every rendered page,
+    and on_decision(image_name, decision) is called with its answer.
+    Pages it doesn't "keep" are not encoded or yielded.
+    """
+    if page_numbers is None:
+        if total_pages is None:
+            total_pages = count_pdf_pages(pdf_bytes)
+        page_numbers = range(1, total_pages + 1)
+    if profile is None:
+        profile = ENCODE_PROFILES[DEFAULT_PROFILE]
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        for first_page, last_page in page_ranges(page_numbers, chunk_size):
+            with span("rasterize"):
+                paths = convert_from_bytes(
+                    pdf_bytes,
+                    dpi=profile.get("dpi", 200),
+                    grayscale=profile.get("grayscale", False),
+                    first_page=first_page,
+                    last_page=last_page,
+                    thread_count=thread_count,
+                    output_folder=output_folder,
+                    paths_only=True,
+                )
+            # pdf2image returns the paths in page order. Each pdftoppm process
+            # names its files with a random prefix, so sorting them would not.
+            for page_num, path in enumerate(paths, start=first_page):
+                image_name = page_image_name(file_name, page_num)
+                with Image.open(path) as img:
+                    decision = None
+                    if page_filter is not None:
+                        with span("filter"):
+                            decision = page_filter(img)
+                    if decision is None or decision["keep"]:
+                        with span("encode"):
+                            image_parts = encode_page(img, profile)
+                os.remove(path)
+                if decision is not None and on_decision:
+                    on_decision(image_name, decision)
+                if decision is not None and not decision["keep"]:
+                    continue
+                yield image_name, image_parts
+
+
+def profile_report(pdf_bytes, profile_names=None, max_pages=3):
+    """
+    Renders and encodes the first few pages with each encoding profile.
+    Returns one dict per profile with the average bytes per page (raw and
+    base64, as sent to Groq) and the render and encode time per page.
+    """
+    if profile_names is None:
+        profile_names = list(ENCODE_PROFILES)
+    pages = min(max_pages, count_pdf_pages(pdf_bytes))
+
+    report = []
+    for name in profile_names:
+        profile = ENCODE_PROFILES[name]
+        start = time.perf_counter()
+        images = convert_from_bytes(
+            pdf_bytes,
+            dpi=profile.get("dpi", 200),
+            grayscale=profile.get("grayscale", False),
+            first_page=1,
+            last_page=pages,
+        )
+        render_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        encoded = [encode_page(img, profile)[0]["data"] for img in images]
+        encode_seconds = time.perf_counter() - start
+
+        raw_bytes = sum(len(data) for data in encoded)
+        base64_bytes = sum(len(base64.b64encode(data)) for data in encoded)
+        report.append({
+            "profile": name,
+            "pages": len(encoded),
+            "bytes_per_page": raw_bytes // len(encoded),
+            "base64_bytes_per_page": base64_bytes // len(encoded),
+            "render_ms_per_page": round(render_seconds * 1000 / len(encoded), 1),
+            "encode_ms_per_page": round(encode_seconds * 1000 / len(encoded), 1),
+        })
+    return report
+
+
+def prefetch(iterable, depth=DEFAULT_PREFETCH):
+    """
+    Runs the iterable on a background thread, keeping up to depth items
+    ready. Used to render pages while earlier pages are waiting on the
+    network. Exceptions from the iterable are raised to the consumer.
+    """
+    items = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    finished = object()
+
+    def put(entry):
+        # Give up if the consumer has gone away, so this thread can exit
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    break
+            else:
+                put((finished, None))
+        except Exception as e:
+            put((finished, e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+
+    # The producer runs in a copy of the caller's context, so run metrics follow it
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is finished:
+                if error:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
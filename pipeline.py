@@ -0,0 +1,633 @@
+import collections
+import concurrent.futures
+import contextvars
+import json
+import os
+import threading
+import time
+from ocr_pool import map_pages_in_order, DEFAULT_MAX_WORKERS
+from pdf_pages import iter_pdf_pages, prefetch, page_image_name, count_pdf_pages, ENCODE_PROFILES, DEFAULT_PROFILE
+from ocr_cache import cache_key
+from compact_format import COMPACT_PROMPT, COMPACT_USER_INPUT, COMPACT_BATCH_PROMPT, decode_compact, approx_tokens
+from sheets import build_row, SECTIONS
+from metrics import span, increment, record_page_filter
+from journal import RENDERED, OCR_DONE, PARSED, FAILED, SKIPPED
+
+# --- Configuration ---
+
+# Model backends (Gemini, Groq, stubs and the Router) live in backends.py.
+# ask_model below is any backend, or any function with the same
+# (prompt, image_data, user_input) -> text signature.
+
+INPUT_PROMPT = """
+You are an expert OCR (Optical Character Recognition) tool.
+Analyze the provided image of a PhD Written Exam answer script.
+Extract the following information:
+1.  **Name**: The name written on the script.
+2.  **Application No**: The application number written on the script.
+3.  **Quantitative Aptitude**: The handwritten answer (A, B, C, or D) for each question from 1 to 30.
+4.  **Verbal**: The handwritten answer (A, B, C, or D) for each question from 1 to 30.
+5.  **Logical Reasoning**: The handwritten answer (A, B, C, or D) for each question from 1 to 20.
+
+Your output **MUST** be a single, valid JSON object with these top-level keys:
+"Name", "Application_No", "Quantitative_Aptitude", "Verbal", "Logical_Reasoning".
+
+For "Quantitative_Aptitude", "Verbal", and "Logical_Reasoning", the values should be nested JSON objects
+where the keys are the question numbers (as strings, e.g., "1") and the values are the marked options (as strings, e.g., "A").
+If a value is not found or is unclear, return an empty string for that specific field/question.
+
+Example JSON structure:
+{
+  "Name": "John Doe",
+  "Application_No": "12345",
+  "Quantitative_Aptitude": {
+    "1": "A",
+    "2": "B",
+    ...
+  },
+  "Verbal": {
+    "1": "C",
+    ...
+  },
+  "Logical_Reasoning": {
+    "1": "D",
+    ...
+  }
+}
+"""
+
+USER_INPUT = "Extract Name, Application No, and all answers as a single JSON object."
+
+# Pages sent in one model request when batching. The instructions are paid
+# once per request instead of once per page.
+DEFAULT_BATCH_SIZE = 1
+
+BATCH_PROMPT = """
+You are an expert OCR (Optical Character Recognition) tool.
+You are given several images, each one page of a PhD Written Exam answer script.
+The page names are listed in the request, in the same order as the images.
+For every page, extract the following information:
+1.  **Name**: The name written on the script.
+2.  **Application No**: The application number written on the script.
+3.  **Quantitative Aptitude**: The handwritten answer (A, B, C, or D) for each question from 1 to 30.
+4.  **Verbal**: The handwritten answer (A, B, C, or D) for each question from 1 to 30.
+5.  **Logical Reasoning**: The handwritten answer (A, B, C, or D) for each question from 1 to 20.
+
+Your output **MUST** be a single, valid JSON object whose keys are the page names, with one entry per image.
+Each value is a JSON object with these keys:
+"Name", "Application_No", "Quantitative_Aptitude", "Verbal", "Logical_Reasoning".
+
+For "Quantitative_Aptitude", "Verbal", and "Logical_Reasoning", the values should be nested JSON objects
+where the keys are the question numbers (as strings, e.g., "1") and the values are the marked options (as strings, e.g., "A").
+If a value is not found or is unclear, return an empty string for that specific field/question.
+Never merge pages or skip a page, even if it looks blank.
+
+Example JSON structure for two pages:
+{
+  "scripts.pdf_page_1": {
+    "Name": "John Doe",
+    "Application_No": "12345",
+    "Quantitative_Aptitude": {"1": "A", "2": "B", ...},
+    "Verbal": {"1": "C", ...},
+    "Logical_Reasoning": {"1": "D", ...}
+  },
+  "scripts.pdf_page_2": {
+    ...
+  }
+}
+"""
+
+
+# How the model is asked to write its answer. decode turns the parsed
+# response into the nested dict build_row expects.
+RESPONSE_FORMATS = {
+    # Nested JSON, one "n": "X" entry per question
+    "json": {"prompt": INPUT_PROMPT, "user_input": USER_INPUT, "batch_prompt": BATCH_PROMPT, "decode": None},
+    # One fixed-length answer string per section: far fewer output tokens
+    "compact": {
+        "prompt": COMPACT_PROMPT,
+        "user_input": COMPACT_USER_INPUT,
+        "batch_prompt": COMPACT_BATCH_PROMPT,
+        "decode": decode_compact,
+    },
+}
+
+# The text a format's single-page results are cached under, built once
+for _response_format in RESPONSE_FORMATS.values():
+    _response_format["cache_prompt"] = _response_format["prompt"] + _response_format["user_input"]
+
+DEFAULT_RESPONSE_FORMAT = "json"
+
+
+def batch_user_input(image_names):
+    """The request text for a batch: the page names, in image order."""
+    names = ", ".join(f'"{name}"' for name in image_names)
+    return f"The {len(image_names)} images are, in order: {names}. Return one JSON object keyed by these page names."
+
+# --- Page Analysis ---
+
+class PageSkipped(Exception):
+    """
+    Reported as a page's error when the page filter kept it away from the
+    model (a blank, cover or instruction page). decision is the filter's
+    verdict, as returned by page_filter.classify_page.
+    """
+
+    def __init__(self, decision):
+        super().__init__(
+            f"{decision['reason']} (ink {decision['ink']:.2%}, grid score {decision['grid_score']:.2f})"
+        )
+        self.decision = decision
+
+
+def parse_response(response_text):
+    """
+    Cleans Markdown code fences off a model response and parses the JSON.
+    Raises json.JSONDecodeError if it is not valid JSON.
+    """
+    with span("parse"):
+        clean_response = response_text.strip().replace("```json", "").replace("```", "")
+        return json.loads(clean_response)
+
+
+def analyze_page(image_data, ask_model, model_name, ocr_cache=None,
+                 use_omr=False, omr_read_header=True, on_response=None,
+                 response_format=DEFAULT_RESPONSE_FORMAT, omr_template=None):
+    """
+    Extracts the data dict for one page. Results come from the OCR cache
+    when the page was seen before. With use_omr, answers are read locally
+    and the model is only asked about what OMR can't read.
+    response_format picks the answer format in RESPONSE_FORMATS; OMR
+    fallback requests always use JSON. omr_template replaces
+    omr.GRID_TEMPLATE, e.g. for pages cropped to regions.
+    on_response(text) is called with each raw model response.
+    Returns None if the model gave no response.
+    """
+    image_bytes = image_data[0]["data"]
+    response_format = RESPONSE_FORMATS[response_format]
+
+    def call_model(prompt, request, decode=None):
+        with span("ocr"):
+            response_text = ask_model(prompt, image_data, request)
+        if on_response:
+            on_response(response_text)
+        if not response_text:
+            return None
+        parsed = parse_response(response_text)
+        return decode(parsed) if decode else parsed
+
+    def compute():
+        return call_model(response_format["prompt"], response_format["user_input"], response_format["decode"])
+
+    if use_omr:
+        # OMR needs NumPy, so it is only imported when it is used
+        from omr import read_page_with_omr, template_fingerprint, FALLBACK_USER_INPUT, GRID_TEMPLATE
+
+        template = omr_template or GRID_TEMPLATE
+        # Cached readings are only reused with the same template and thresholds
+        model_name += "+omr" if omr_read_header else "+omr_answers_only"
+        model_name += f"@{template_fingerprint(template)}"
+
+        def compute():
+            return read_page_with_omr(
+                image_bytes,
+                lambda prompt: call_model(prompt, FALLBACK_USER_INPUT),
+                template=template,
+                read_header=omr_read_header,
+            )
+
+    if ocr_cache is None:
+        return compute()
+    return ocr_cache.get_or_compute(
+        image_bytes, model_name, response_format["cache_prompt"], compute
+    )
+
+
+def is_valid_page_result(data_dict):
+    """True if a page result has the header fields and every answer section."""
+    if not isinstance(data_dict, dict):
+        return False
+    if "Name" not in data_dict or "Application_No" not in data_dict:
+        return False
+    return all(isinstance(data_dict.get(section), dict) for section, _, _ in SECTIONS)
+
+
+def split_batch_response(parsed, image_names):
+    """
+    Maps a parsed batch response to {image_name: data_dict}. Accepts the
+    requested object keyed by page name, or a plain array in image order.
+    """
+    if isinstance(parsed, list):
+        return dict(zip(image_names, parsed)) if len(parsed) == len(image_names) else {}
+    if isinstance(parsed, dict):
+        return {name: parsed[name] for name in image_names if name in parsed}
+    return {}
+
+
+def analyze_batch(pages, ask_model, model_name, ocr_cache=None, on_response=None,
+                  response_format=DEFAULT_RESPONSE_FORMAT):
+    """
+    Extracts the data dicts for several pages with one model request.
+    pages is a list of (image_name, image_data). Pages missing or malformed
+    in the response are split into smaller batches and asked again, down
+    to single-page requests with the normal prompt.
+    on_response(image_names, text) is called with each raw model response.
+    Returns {image_name: (data_dict, error)}.
+    """
+    batch_prompt = RESPONSE_FORMATS[response_format]["batch_prompt"]
+    decode = RESPONSE_FORMATS[response_format]["decode"]
+    results = {}
+    todo = []
+    for image_name, image_data in pages:
+        key = cache_key(image_data[0]["data"], model_name, batch_prompt)
+        cached = ocr_cache.get(key) if ocr_cache is not None else None
+        if cached is not None:
+            results[image_name] = (cached, None)
+        else:
+            todo.append((image_name, image_data, key))
+
+    def ask(batch):
+        image_names = [image_name for image_name, _, _ in batch]
+        if len(batch) == 1:
+            image_name, image_data, _ = batch[0]
+            try:
+                data_dict = analyze_page(
+                    image_data, ask_model, model_name,
+                    on_response=on_response and (lambda text: on_response(image_names, text)),
+                    response_format=response_format,
+                )
+            except Exception as e:
+                return {image_name: (None, e)}
+            return {image_name: (data_dict, None)}
+
+        image_data = [image for _, data, _ in batch for image in data]
+        try:
+            with span("ocr"):
+                response_text = ask_model(batch_prompt, image_data, batch_user_input(image_names))
+            if on_response:
+                on_response(image_names, response_text)
+            by_name = split_batch_response(parse_response(response_text), image_names) if response_text else {}
+        except json.JSONDecodeError:
+            by_name = {}
+        except Exception as e:
+            return {image_name: (None, e) for image_name in image_names}
+
+        found = {}
+        retry = []
+        for item in batch:
+            data_dict = by_name.get(item[0])
+            if decode and data_dict is not None:
+                data_dict = decode(data_dict)
+            if is_valid_page_result(data_dict):
+                found[item[0]] = (data_dict, None)
+            else:
+                retry.append(item)
+        # Re-split whatever came back missing or malformed and ask again
+        if len(retry) == 1:
+            found.update(ask(retry))
+        elif retry:
+            half = (len(retry) + 1) // 2
+            found.update(ask(retry[:half]))
+            found.update(ask(retry[half:]))
+        return found
+
+    if todo:
+        answered = ask(todo)
+        for image_name, _, key in todo:
+            data_dict, error = answered[image_name]
+            if ocr_cache is not None and data_dict:
+                ocr_cache.put(key, data_dict)
+            results[image_name] = (data_dict, error)
+    return results
+
+
+def batch_pages(pages, batch_size):
+    """Groups (image_name, image_data) pages into (batch_name, pages) batches."""
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) == batch_size:
+            yield batch[0][0], batch
+            batch = []
+    if batch:
+        yield batch[0][0], batch
+
+
+def analyze_pdf(pdf_bytes, file_name, ask_model, model_name, total_pages=None,
+                profile_name=DEFAULT_PROFILE, max_workers=DEFAULT_MAX_WORKERS,
+                ocr_cache=None, use_omr=False, omr_read_header=True, on_page_done=None,
+                page_numbers=None, journal=None, job_id=None, batch_size=DEFAULT_BATCH_SIZE,
+                response_format=DEFAULT_RESPONSE_FORMAT, profile=None, filter_pages=False):
+    """
+    Streams the pages of a PDF through the model on a bounded worker pool.
+    Yields (image_name, image_data, data_dict, error) in page order, where
+    error is the exception raised for that page (or None).
+    With filter_pages, blank, cover and instruction pages are recognized
+    right after rendering and never encoded or sent to the model; they
+    are yielded with empty image_data and a PageSkipped error.
+    on_page_done(done_count) is called from the calling thread as pages
+    finish; done_count includes skipped pages, so it reaches the number
+    of pages in the run.
+    page_numbers limits the run to those pages. With a journal, every
+    page's progress is recorded under job_id, and pages parsed in an
+    earlier run reuse the recorded result instead of calling the model.
+    With batch_size > 1, that many pages are sent per model request
+    (capped by the backend's max_images); OMR runs stay one page per request.
+    response_format picks the answer format in RESPONSE_FORMATS.
+    profile is an encoding profile dict used instead of profile_name.
+    """
+    if page_numbers is None:
+        if total_pages is None:
+            total_pages = count_pdf_pages(pdf_bytes)
+        page_numbers = range(1, total_pages + 1)
+    page_of = {page_image_name(file_name, n): n for n in page_numbers}
+
+    # Pages the filter skipped, in page order. The render thread adds each
+    # one before yielding any later page, so they can be merged back in order.
+    skipped = collections.deque()
+
+    def on_decision(image_name, decision):
+        # Every page's decision is kept, so near misses can be looked into
+        # and the thresholds tuned from real runs
+        record_page_filter(image_name, decision)
+        if journal is not None:
+            journal.record_filter_decision(job_id, image_name, page_of[image_name], decision)
+        if decision["keep"]:
+            return
+        skip = PageSkipped(decision)
+        skipped.append((image_name, skip))
+        if journal is not None:
+            journal.mark(job_id, image_name, page_of[image_name], SKIPPED, error=str(skip))
+
+    page_filter = None
+    if filter_pages:
+        # The filter needs NumPy, so it is only imported when it is used
+        from page_filter import classify_page
+
+        page_filter = classify_page
+
+    progress = {"analyzed": 0, "skipped": 0}
+
+    def page_done(analyzed=None):
+        """Reports progress to on_page_done; without analyzed, a page was skipped."""
+        if analyzed is None:
+            progress["skipped"] += 1
+        else:
+            progress["analyzed"] = analyzed
+        if on_page_done:
+            on_page_done(progress["analyzed"] + progress["skipped"])
+
+    def skipped_results(before=None):
+        """Results for the skipped pages numbered below before (all of them by default)."""
+        while skipped and (before is None or page_of[skipped[0][0]] < before):
+            image_name, skip = skipped.popleft()
+            increment("pages_skipped")
+            page_done()
+            yield image_name, [], None, skip
+
+    profile = profile or ENCODE_PROFILES[profile_name]
+    omr_template = None
+    if use_omr and profile.get("regions"):
+        # OMR reads the cropped page, so the grids are where the crops put them
+        from omr import cropped_template
+
+        omr_template = cropped_template(profile["regions"])
+
+    pages = iter_pdf_pages(
+        pdf_bytes, file_name, profile=profile, page_numbers=page_numbers,
+        page_filter=page_filter, on_decision=on_decision,
+    )
+
+    def worker(image_name, image_data):
+        if journal is None:
+            return analyze_page(
+                image_data, ask_model, model_name, ocr_cache, use_omr, omr_read_header,
+                response_format=response_format, omr_template=omr_template,
+            )
+
+        # Pages parsed in an earlier run only still need writing
+        data_dict = journal.parsed_data(job_id, image_name)
+        if data_dict is not None:
+            return data_dict
+
+        page_num = page_of[image_name]
+        journal.mark(job_id, image_name, page_num, RENDERED)
+
+        def record_response(response_text):
+            journal.mark(job_id, image_name, page_num, OCR_DONE, raw_response=response_text)
+
+        try:
+            data_dict = analyze_page(
+                image_data, ask_model, model_name, ocr_cache, use_omr, omr_read_header,
+                on_response=record_response,
+                response_format=response_format, omr_template=omr_template,
+            )
+        except Exception as e:
+            journal.mark(job_id, image_name, page_num, FAILED, error=str(e))
+            raise
+        if data_dict:
+            journal.mark(job_id, image_name, page_num, PARSED, data_dict=data_dict)
+        else:
+            journal.mark(job_id, image_name, page_num, FAILED, error="No response")
+        return data_dict
+
+    max_images = getattr(ask_model, "max_images", None)
+    if max_images:
+        batch_size = min(batch_size, max_images)
+    if use_omr or batch_size <= 1:
+        results = map_pages_in_order(worker, prefetch(pages), max_workers=max_workers, on_page_done=page_done)
+        for page_result in results:
+            yield from skipped_results(page_of[page_result[0]])
+            increment("pages_failed" if page_result[3] or not page_result[2] else "pages")
+            yield page_result
+        yield from skipped_results()
+        return
+
+    def batch_worker(batch_name, batch):
+        results = {}
+        todo = []
+        for image_name, image_data in batch:
+            data_dict = journal.parsed_data(job_id, image_name) if journal is not None else None
+            if data_dict is not None:
+                results[image_name] = (data_dict, None)
+                continue
+            todo.append((image_name, image_data))
+            if journal is not None:
+                journal.mark(job_id, image_name, page_of[image_name], RENDERED)
+
+        def record_response(image_names, response_text):
+            for image_name in image_names:
+                journal.mark(job_id, image_name, page_of[image_name], OCR_DONE, raw_response=response_text)
+
+        if todo:
+            answered = analyze_batch(
+                todo, ask_model, model_name, ocr_cache,
+                on_response=record_response if journal is not None else None,
+                response_format=response_format,
+            )
+            for image_name, _ in todo:
+                data_dict, error = answered[image_name]
+                if journal is not None:
+                    page_num = page_of[image_name]
+                    if data_dict:
+                        journal.mark(job_id, image_name, page_num, PARSED, data_dict=data_dict)
+                    else:
+                        journal.mark(job_id, image_name, page_num, FAILED, error=str(error or "No response"))
+                results[image_name] = (data_dict, error)
+        return [(image_name, image_data) + results[image_name] for image_name, image_data in batch]
+
+    # Progress is reported per page as batches are handed back in order
+    done_count = 0
+    batches = map_pages_in_order(batch_worker, batch_pages(prefetch(pages), batch_size), max_workers=max_workers)
+    for _, batch, page_results, error in batches:
+        if error:
+            page_results = [(image_name, image_data, None, error) for image_name, image_data in batch]
+        for page_result in page_results:
+            yield from skipped_results(page_of[page_result[0]])
+            done_count += 1
+            page_done(done_count)
+            increment("pages_failed" if page_result[3] or not page_result[2] else "pages")
+            yield page_result
+    yield from skipped_results()
+
+
+def response_format_report(pdf_bytes, file_name, ask_model, format_names=None, max_pages=2,
+                           profile_name=DEFAULT_PROFILE):
+    """
+    Asks the model about the first max_pages pages in every response format
+    and compares them. Returns a list of dicts, one per format, with the
+    prompt and output token counts (approximate, see approx_tokens), the
+    output size, latency per page and how many pages decoded to a full result.
+    """
+    page_numbers = range(1, min(max_pages, count_pdf_pages(pdf_bytes)) + 1)
+    pages = list(iter_pdf_pages(
+        pdf_bytes, file_name, profile=ENCODE_PROFILES[profile_name], page_numbers=page_numbers
+    ))
+    report = []
+    for name in format_names or list(RESPONSE_FORMATS):
+        response_format = RESPONSE_FORMATS[name]
+        output_tokens = output_chars = valid = 0
+        seconds = 0.0
+        for _, image_data in pages:
+            start = time.perf_counter()
+            response_text = ask_model(response_format["prompt"], image_data, response_format["user_input"]) or ""
+            seconds += time.perf_counter() - start
+            output_tokens += approx_tokens(response_text)
+            output_chars += len(response_text)
+            try:
+                parsed = parse_response(response_text)
+                data_dict = response_format["decode"](parsed) if response_format["decode"] else parsed
+                valid += is_valid_page_result(data_dict)
+            except json.JSONDecodeError:
+                pass
+        count = max(1, len(pages))
+        report.append({
+            "format": name,
+            "pages": len(pages),
+            "prompt_tokens": approx_tokens(response_format["prompt"] + response_format["user_input"]),
+            "output_tokens_per_page": round(output_tokens / count),
+            "output_chars_per_page": round(output_chars / count),
+            "latency_ms_per_page": round(seconds * 1000 / count),
+            "valid_pages": valid,
+        })
+    return report
+
+
+def write_page(writer, data_dict, image_name, journal=None, job_id=None):
+    """
+    Adds a page's row to the writer. With a journal, the page is marked
+    written once the row has actually been sent to the sheet.
+    """
+    on_written = None
+    if journal is not None:
+        def on_written():
+            journal.mark_written(job_id, image_name)
+    writer.add(build_row(data_dict, image_name), on_written=on_written)
+
+# --- Batch Processing ---
+
+def process_pdf_file(path, ask_model, model_name, writer, log=print, journal=None, on_progress=None, **options):
+    """
+    Analyzes one PDF file and adds a row per page to the writer.
+    Returns (pages_written, pages_failed). Failed pages are logged and skipped.
+    With a journal, pages written by an earlier run are skipped.
+    Pages the page filter skipped are logged and count as neither.
+    on_progress(pages_done, pages_failed, total_pages) is called before the
+    first page and after every page; pages_done includes pages written by
+    an earlier run and pages the filter skipped.
+    """
+    with open(path, "rb") as f:
+        pdf_bytes = f.read()
+    file_name = os.path.basename(path)
+
+    job_id = page_numbers = total_pages = None
+    if journal is not None or on_progress is not None:
+        total_pages = count_pdf_pages(pdf_bytes)
+    already_written = 0
+    if journal is not None:
+        job_id = journal.start_job(pdf_bytes, file_name, total_pages)
+        page_numbers = journal.pending_pages(job_id, total_pages)
+        already_written = total_pages - len(page_numbers)
+        if already_written:
+            log(f"{path}: resuming, {already_written} of {total_pages} pages already written")
+
+    written = failed = skipped = 0
+    if on_progress:
+        on_progress(already_written, failed, total_pages)
+    results = analyze_pdf(
+        pdf_bytes, file_name, ask_model, model_name,
+        page_numbers=page_numbers, journal=journal, job_id=job_id, **options
+    )
+    for image_name, _, data_dict, error in results:
+        if isinstance(error, PageSkipped):
+            skipped += 1
+            log(f"{image_name}: skipped, {error}")
+        elif error or not data_dict:
+            failed += 1
+            log(f"{image_name}: failed ({error or 'no response'})")
+        else:
+            write_page(writer, data_dict, image_name, journal, job_id)
+            written += 1
+        if on_progress:
+            on_progress(already_written + written + skipped, failed, total_pages)
+    return written, failed
+
+
+def run_batch(paths, ask_model, model_name, writer, file_workers=1, log=print, **options):
+    """
+    Processes many PDFs, file_workers files at a time, each with its own
+    page worker pool. Rows go to the writer, which is flushed at the end
+    even if the batch stops partway. Returns throughput statistics.
+    """
+    stats = {"files": 0, "files_failed": 0, "pages": 0, "pages_failed": 0}
+    stats_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run_file(path):
+        file_start = time.perf_counter()
+        try:
+            written, failed = process_pdf_file(path, ask_model, model_name, writer, log=log, **options)
+        except Exception as e:
+            log(f"{path}: failed ({e})")
+            with stats_lock:
+                stats["files_failed"] += 1
+            return
+        with stats_lock:
+            stats["files"] += 1
+            stats["pages"] += written
+            stats["pages_failed"] += failed
+        log(f"{path}: {written} pages written, {failed} failed in {time.perf_counter() - file_start:.1f}s")
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, file_workers)) as executor:
+            # Each file runs in a copy of the caller's context, so run metrics follow it
+            futures = [executor.submit(contextvars.copy_context().run, run_file, path) for path in paths]
+            for future in futures:
+                future.result()
+    finally:
+        writer.flush()
+
+    seconds = time.perf_counter() - start
+    stats["seconds"] = round(seconds, 2)
+    stats["pages_per_second"] = round(stats["pages"] / seconds, 2) if seconds else 0.0
+    return stats
@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from metrics import span
+
+# --- Configuration ---
+
+# Default client-side quotas per provider: requests and tokens per minute.
+# These match the free tiers; raise them for paid quotas.
+PROVIDER_LIMITS = {
+    "gemini": {"requests_per_minute": 30, "tokens_per_minute": 1_000_000},
+    "groq": {"requests_per_minute": 30, "tokens_per_minute": 30_000},
+    # Google Sheets API: 60 write requests per minute per user
+    "sheets": {"requests_per_minute": 60, "tokens_per_minute": None},
+}
+
+# Rough token cost of one page request, used for the tokens-per-minute bucket
+IMAGE_TOKENS = 1024
+OUTPUT_TOKENS = 600
+
+DEFAULT_MAX_ATTEMPTS = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# After throttling the rate is halved (down to MIN_SCALE of the quota),
+# and each success wins back RECOVERY_STEP of it.
+MIN_SCALE = 0.1
+RECOVERY_STEP = 0.05
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def split_quota(quota, share):
+    """
+    One process's part of a quota that share processes use at the same
+    time (e.g. worker processes calling the same API key).
+    """
+    return {key: value / share if value else value for key, value in quota.items()}
+
+
+def estimate_tokens(prompt, user_input="", images=1):
+    """Rough token count of a request for images pages: ~4 characters per text token."""
+    return (len(prompt) + len(user_input)) // 4 + images * (IMAGE_TOKENS + OUTPUT_TOKENS)
+
+
+def status_code(error):
+    """
+    Finds the HTTP status of an exception from the Gemini, Groq or gspread
+    clients without importing them. Returns None if there isn't one.
+    """
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def retry_after_seconds(error):
+    """Returns the Retry-After delay a server sent with the error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error):
+    """True for throttling, transient server errors, timeouts and dropped connections."""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    name = type(error).__name__
+    return any(word in name for word in ("Timeout", "Connection", "ResourceExhausted", "ServiceUnavailable"))
+
+
+class RateLimiter:
+    """
+    Client-side token bucket for requests per minute and (optionally)
+    tokens per minute, shared by all threads calling one provider.
+    It slows down automatically when the provider throttles us and
+    speeds back up as requests succeed.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, name=""):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.scale = 1.0
+        self.throttle_events = 0
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            rate = self.requests_per_minute * self.scale / 60.0
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * rate)
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute * self.scale / 60.0
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * rate)
+
+    def acquire(self, tokens=0):
+        """Blocks until one request (and tokens, if limited) can be sent."""
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    waits = [0.0]
+                    if self.requests_per_minute and self._requests < 1:
+                        waits.append((1 - self._requests) / (self.requests_per_minute * self.scale / 60.0))
+                    if self.tokens_per_minute and self._tokens < tokens:
+                        waits.append((tokens - self._tokens) / (self.tokens_per_minute * self.scale / 60.0))
+                    wait = max(waits)
+                    if wait <= 0:
+                        if self.requests_per_minute:
+                            self._requests -= 1
+                        if self.tokens_per_minute:
+                            self._tokens -= tokens
+                        return
+            time.sleep(wait)
+
+    def throttled(self, retry_after=None):
+        """Called when the provider answered 429: halve the rate and pause if asked to."""
+        with self._lock:
+            self.throttle_events += 1
+            self.scale = max(MIN_SCALE, self.scale / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        """Called after a successful request: win back some of the rate."""
+        with self._lock:
+            self.scale = min(1.0, self.scale + RECOVERY_STEP)
+
+    def stats(self):
+        with self._lock:
+            return {"scale": round(self.scale, 2), "throttle_events": self.throttle_events}
+
+
+def call_with_retry(fn, limiter=None, tokens=0, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                    base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """
+    Calls fn() under the rate limiter, retrying throttling and transient
+    errors with exponential backoff and jitter. A Retry-After header from
+    the server takes precedence over the computed delay. Other errors,
+    and the last attempt's error, are raised.
+    """
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None:
+            with span("rate_limit_wait"):
+                limiter.acquire(tokens)
+        try:
+            result = fn()
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e):
+                raise
+            retry_after = retry_after_seconds(e)
+            if limiter is not None and status_code(e) == 429:
+                limiter.throttled(retry_after)
+            if retry_after is None:
+                # Equal jitter: half the backoff is fixed, half random
+                backoff = min(max_delay, base_delay * 2 ** (attempt - 1))
+                retry_after = backoff / 2 + random.uniform(0, backoff / 2)
+            time.sleep(retry_after)
+            continue
+        if limiter is not None:
+            limiter.succeeded()
+        return result
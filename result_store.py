@@ -0,0 +1,230 @@
+import re
+import sqlite3
+import threading
+import time
+from sheets import ALL_HEADERS, SheetWriter
+
+# --- Configuration ---
+
+DEFAULT_STORE_PATH = "results.sqlite3"
+
+# Rows per bulk insert into the local store
+DEFAULT_STORE_FLUSH_EVERY = 100
+# Rows per Sheets write when mirroring, and seconds between sync passes
+DEFAULT_SYNC_BATCH = 500
+DEFAULT_SYNC_INTERVAL = 5.0
+
+# One column per sheet column: "Image Name" -> image_name, "QA_Q1" -> qa_q1
+COLUMNS = [re.sub(r"\W+", "_", header).lower() for header in ALL_HEADERS]
+
+
+class ResultStore:
+    """
+    Local SQLite copy of every result row, with one column per sheet column,
+    so the full dataset can be queried at any size. Rows are inserted in
+    bulk and flagged once they have been mirrored to the Google Sheet.
+    Each row records whether it should update a matching sheet row
+    (upsert) or be appended. Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{column} TEXT" for column in COLUMNS)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            f" {columns},"
+            " created_at REAL NOT NULL,"
+            " synced INTEGER NOT NULL DEFAULT 0,"
+            " upsert INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Stores created before rows recorded their upsert mode
+        existing = [column[1] for column in self._conn.execute("PRAGMA table_info(results)")]
+        if "upsert" not in existing:
+            self._conn.execute("ALTER TABLE results ADD COLUMN upsert INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_unsynced ON results (id) WHERE synced = 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_application_no ON results (application_no)")
+        self._conn.commit()
+
+    def add_rows(self, rows, upsert=False):
+        """Inserts sheet rows (ALL_HEADERS layout) in one transaction."""
+        now = time.time()
+        values = [
+            ["" if value is None else str(value) for value in row[:len(COLUMNS)]]
+            + [""] * (len(COLUMNS) - len(row)) + [now, int(upsert)]
+            for row in rows
+        ]
+        placeholders = ", ".join("?" * (len(COLUMNS) + 2))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO results ({', '.join(COLUMNS)}, created_at, upsert) VALUES ({placeholders})", values
+            )
+            self._conn.commit()
+
+    def unsynced(self, limit=DEFAULT_SYNC_BATCH, upsert=False):
+        """
+        Returns up to limit (id, row) pairs not yet mirrored to the sheet,
+        oldest first, from the rows stored with the given upsert mode.
+        """
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM results WHERE synced = 0 AND upsert = ? ORDER BY id LIMIT ?",
+                (int(upsert), limit),
+            ).fetchall()
+        return [(record[0], list(record[1:])) for record in records]
+
+    def mark_synced(self, ids):
+        with self._lock:
+            self._conn.executemany("UPDATE results SET synced = 1 WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def query(self, sql, params=()):
+        """Runs a read query against the results table and returns all rows."""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def counts(self):
+        """Returns {"rows": total rows, "pending_sync": rows not yet in the sheet}."""
+        with self._lock:
+            total, pending = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(synced = 0), 0) FROM results"
+            ).fetchone()
+        return {"rows": total, "pending_sync": pending}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class StoreWriter:
+    """
+    Drop-in replacement for SheetWriter that writes rows to the local
+    ResultStore in bulk instead of to Google Sheets, so page processing
+    never waits on the Sheets API. SheetSync mirrors the rows later,
+    updating matching sheet rows if upsert is set.
+    """
+
+    def __init__(self, store, flush_every=DEFAULT_STORE_FLUSH_EVERY, upsert=False):
+        self.store = store
+        self.upsert = upsert
+        self.flush_every = max(1, int(flush_every))
+        self.rows_written = 0
+        self._buffer = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add(self, row, on_written=None):
+        """
+        Buffers a row, flushing the buffer once it is full.
+        on_written() is called once the row is committed to the store.
+        """
+        with self._lock:
+            self._buffer.append(row)
+            if on_written:
+                self._callbacks.append(on_written)
+            full = len(self._buffer) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Inserts all buffered rows. Returns the number of rows written."""
+        with self._lock:
+            if not self._buffer:
+                return 0
+            rows, callbacks = self._buffer, self._callbacks
+            self.store.add_rows(rows, upsert=self.upsert)
+            self._buffer, self._callbacks = [], []
+            self.rows_written += len(rows)
+        for on_written in callbacks:
+            on_written()
+        return len(rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+
+class SheetSync:
+    """
+    Background thread that mirrors new store rows to the Google Sheet in
+    large batches through a SheetWriter (so rate limiting, retries and
+    upserts apply). Rows are flagged as synced only after the sheet write
+    succeeds; on failure the batch is retried on the next pass, and rows
+    left unsynced when the process stops are picked up by the next run.
+    With an index, only rows stored with upsert are synced (and update
+    matching sheet rows); without, only the others. The index is only
+    touched by this sync.
+    """
+
+    def __init__(self, store, worksheet, batch_size=DEFAULT_SYNC_BATCH,
+                 interval=DEFAULT_SYNC_INTERVAL, limiter=None, index=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.interval = interval
+        self.upsert = index is not None
+        self.writer = SheetWriter(worksheet, limiter=limiter, index=index)
+        self.rows_synced = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+
+    def sync_once(self):
+        """Mirrors one batch of unsynced rows. Returns the number of rows synced."""
+        with self._sync_lock:
+            batch = self.store.unsynced(self.batch_size, upsert=self.upsert)
+            if not batch:
+                return 0
+            self.writer.write([row for _, row in batch])
+            self.store.mark_synced([record_id for record_id, _ in batch])
+            self.rows_synced += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Keep going while there is a backlog, then wait for the next pass
+                while not self._stop.is_set() and self.sync_once() == self.batch_size:
+                    pass
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Starts a sync pass now instead of waiting for the interval."""
+        self._wake.set()
+
+    def stop(self, drain=True):
+        """
+        Stops the background thread. With drain, every remaining row is
+        synced first; errors from that final pass propagate.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if drain:
+            while self.sync_once():
+                pass
+
+    def stats(self):
+        stats = dict(self.store.counts(), rows_synced=self.rows_synced)
+        if self.last_error is not None:
+            stats["last_error"] = str(self.last_error)
+        return stats
@@ -0,0 +1,277 @@
+import re
+import threading
+from metrics import span
+from rate_limit import call_with_retry
+
+# --- Configuration ---
+
+# Answer sections on the script and how many questions each one has
+SECTIONS = [
+    ("Quantitative_Aptitude", "QA", 30),
+    ("Verbal", "Verbal", 30),
+    ("Logical_Reasoning", "LR", 20),
+]
+
+# Rows are sent to the sheet in one append_rows call once this many are buffered
+DEFAULT_FLUSH_EVERY = 25
+
+ALL_HEADERS = ["Image Name", "Name", "Application_No"] + [
+    f"{prefix}_Q{i}" for _, prefix, count in SECTIONS for i in range(1, count + 1)
+]
+
+# Question keys of each section, in column order, so build_row doesn't rebuild them per page
+_QUESTION_KEYS = [(section, [str(i) for i in range(1, count + 1)]) for section, _, count in SECTIONS]
+
+
+def column_letter(column):
+    """The A1 letter of a 1-based column number (1 -> A, 27 -> AA)."""
+    letters = ""
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+# Last column of a result row, for A1 ranges
+LAST_COLUMN = column_letter(len(ALL_HEADERS))
+
+
+def build_row(data_dict, image_name):
+    """
+    Turns the extracted data for one page into a sheet row
+    matching ALL_HEADERS.
+    """
+    row_data = [image_name]
+    row_data.append(data_dict.get("Name", ""))
+    row_data.append(data_dict.get("Application_No", ""))
+
+    for section, keys in _QUESTION_KEYS:
+        answers = data_dict.get(section, {})
+        row_data.extend(answers.get(key, "") for key in keys)
+
+    return row_data
+
+
+def open_spreadsheet(sheet_id, service_account_info=None, service_account_file=None):
+    """
+    Authenticates and opens the spreadsheet. Pass either the parsed
+    service-account dict or the path to its JSON file.
+    """
+    # Imported here so importing sheets for its constants stays cheap
+    import gspread
+
+    if service_account_info is not None:
+        gc = gspread.service_account_from_dict(service_account_info)
+    else:
+        gc = gspread.service_account(filename=service_account_file)
+    return gc.open_by_key(sheet_id)
+
+
+def open_worksheet(sheet_id, service_account_info=None, service_account_file=None):
+    """
+    Authenticates once and returns the first worksheet of the spreadsheet.
+    """
+    sh = open_spreadsheet(sheet_id, service_account_info, service_account_file)
+    return sh.get_worksheet(0)
+
+
+def get_or_create_worksheet(spreadsheet, title, rows=1000, cols=26):
+    """Returns the worksheet with this title, adding it if it doesn't exist."""
+    import gspread
+
+    try:
+        return spreadsheet.worksheet(title)
+    except gspread.exceptions.WorksheetNotFound:
+        return spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+
+
+def ensure_header_row(worksheet):
+    """
+    Writes the header row if the sheet is empty.
+    Returns True if a header row was created.
+    """
+    first_row_values = worksheet.row_values(1)
+    if not first_row_values or first_row_values[0] == "":
+        worksheet.append_row(ALL_HEADERS)
+        return True
+    return False
+
+
+def normalize_row(row):
+    """A row as the sheet returns it: strings, padded or cut to ALL_HEADERS."""
+    values = ["" if value is None else str(value) for value in row[:len(ALL_HEADERS)]]
+    return values + [""] * (len(ALL_HEADERS) - len(values))
+
+
+def appended_first_row(response):
+    """The first row number an append_rows response says it wrote, or None."""
+    updated_range = ((response or {}).get("updates") or {}).get("updatedRange", "")
+    match = re.search(r"[A-Z]+(\d+)", updated_range.rsplit("!", 1)[-1])
+    return int(match.group(1)) if match else None
+
+
+class SheetIndex:
+    """
+    In-memory map from Application_No and Image Name to sheet row number,
+    built from one bulk read of the sheet and kept up to date as rows are
+    written, so upserts never rescan the sheet. Lookups prefer
+    Application_No and fall back to Image Name when it is blank.
+    """
+
+    APPLICATION_NO = ALL_HEADERS.index("Application_No")
+
+    def __init__(self, values=()):
+        self.rows = {}       # row number -> normalized row values
+        self._by_application_no = {}
+        self._by_image_name = {}
+        self.next_row = 1
+        for row_number, row in enumerate(values, start=1):
+            self.next_row = row_number + 1
+            # Row 1 is the header
+            if row_number > 1 and any(row):
+                self.record(row_number, row)
+
+    @classmethod
+    def load(cls, worksheet, limiter=None):
+        """Builds the index with a single get_all_values call."""
+        return cls(call_with_retry(worksheet.get_all_values, limiter))
+
+    def find(self, row):
+        """Returns the row number already holding this candidate or page, or None."""
+        application_no = str(row[self.APPLICATION_NO] or "").strip()
+        if application_no and application_no in self._by_application_no:
+            return self._by_application_no[application_no]
+        return self._by_image_name.get(str(row[0]))
+
+    def is_unchanged(self, row_number, row):
+        return self.rows.get(row_number) == normalize_row(row)
+
+    def record(self, row_number, row):
+        """Stores the values now in row_number, replacing its old keys."""
+        old = self.rows.get(row_number)
+        if old is not None:
+            if self._by_application_no.get(old[self.APPLICATION_NO].strip()) == row_number:
+                del self._by_application_no[old[self.APPLICATION_NO].strip()]
+            if self._by_image_name.get(old[0]) == row_number:
+                del self._by_image_name[old[0]]
+        row = normalize_row(row)
+        self.rows[row_number] = row
+        if row[self.APPLICATION_NO].strip():
+            self._by_application_no[row[self.APPLICATION_NO].strip()] = row_number
+        if row[0]:
+            self._by_image_name[row[0]] = row_number
+        self.next_row = max(self.next_row, row_number + 1)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class SheetWriter:
+    """
+    Buffers rows and writes them to the worksheet with a single
+    append_rows call per flush_every rows. Use it as a context manager
+    (or call flush in a finally block) so buffered rows are still
+    written when a run stops partway. Writes go through the optional
+    rate limiter and are retried on throttling and transient errors.
+
+    With a SheetIndex the writer upserts: rows for a candidate or page
+    already in the sheet are updated in place with one batch_update per
+    flush, identical rows are skipped, and only new rows are appended.
+    """
+
+    def __init__(self, worksheet, flush_every=DEFAULT_FLUSH_EVERY, limiter=None, index=None):
+        self.worksheet = worksheet
+        self.flush_every = max(1, int(flush_every))
+        self.limiter = limiter
+        self.index = index
+        self.rows_written = 0
+        self.rows_updated = 0
+        self.rows_skipped = 0
+        self._buffer = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add(self, row, on_written=None):
+        """
+        Buffers a row, flushing the buffer once it is full.
+        on_written() is called once the row has actually reached the sheet.
+        """
+        with self._lock:
+            self._buffer.append(row)
+            if on_written:
+                self._callbacks.append(on_written)
+            full = len(self._buffer) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows. Returns the number of rows written.
+        If the write fails the rows stay buffered so a later flush can retry.
+        """
+        with self._lock:
+            if not self._buffer:
+                return 0
+            rows, callbacks = self._buffer, self._callbacks
+            written = self.write(rows)
+            self._buffer, self._callbacks = [], []
+        for on_written in callbacks:
+            on_written()
+        return written
+
+    def write(self, rows):
+        """
+        Writes rows right away, bypassing the buffer (appending, or upserting
+        with an index). Returns the number of rows written; errors propagate.
+        """
+        with span("write"):
+            if self.index is None:
+                call_with_retry(lambda: self.worksheet.append_rows(rows), self.limiter)
+                written = len(rows)
+            else:
+                written = self._upsert(rows)
+        self.rows_written += written
+        return written
+
+    def _upsert(self, rows):
+        """Updates changed rows, skips identical ones and appends the rest."""
+        updates = {}   # row number -> row
+        appends = []
+        appended_at = {}  # image name or Application_No -> position in appends
+        for row in rows:
+            row_number = self.index.find(row)
+            if row_number is None:
+                key = str(row[SheetIndex.APPLICATION_NO] or "").strip() or row[0]
+                if key in appended_at:
+                    # The same candidate twice in one flush: the later row wins
+                    appends[appended_at[key]] = row
+                else:
+                    appended_at[key] = len(appends)
+                    appends.append(row)
+            elif self.index.is_unchanged(row_number, row):
+                self.rows_skipped += 1
+            else:
+                updates[row_number] = row
+
+        if updates:
+            data = [
+                {"range": f"A{n}:{LAST_COLUMN}{n}", "values": [row]}
+                for n, row in updates.items()
+            ]
+            call_with_retry(lambda: self.worksheet.batch_update(data), self.limiter)
+            for row_number, row in updates.items():
+                self.index.record(row_number, row)
+            self.rows_updated += len(updates)
+        if appends:
+            response = call_with_retry(lambda: self.worksheet.append_rows(appends), self.limiter)
+            first_row = appended_first_row(response) or self.index.next_row
+            for offset, row in enumerate(appends):
+                self.index.record(first_row + offset, row)
+        return len(updates) + len(appends)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
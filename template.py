@@ -0,0 +1,46 @@
+# --- Configuration ---
+
+# Where the header (Name and Application No) and each answer grid sit on
+# the answer script, as (left, top, right, bottom) fractions of the page.
+# Rows of a grid are questions, columns are options. OMR refines the grid
+# boxes on every page, so they only need to be roughly right; calibrate
+# them against a scanned sample of the template.
+HEADER_BOX = (0.03, 0.02, 0.97, 0.15)
+GRID_BOXES = {
+    "Quantitative_Aptitude": (0.05, 0.25, 0.33, 0.95),
+    "Verbal": (0.36, 0.25, 0.64, 0.95),
+    "Logical_Reasoning": (0.67, 0.25, 0.95, 0.72),
+}
+
+
+def bounding_box(boxes, margin=0.0):
+    """The smallest box holding all of boxes, grown by margin and kept on the page."""
+    boxes = list(boxes)
+    return (
+        max(0.0, min(box[0] for box in boxes) - margin),
+        max(0.0, min(box[1] for box in boxes) - margin),
+        min(1.0, max(box[2] for box in boxes) + margin),
+        min(1.0, max(box[3] for box in boxes) + margin),
+    )
+
+
+def place_in_regions(box, regions):
+    """
+    Where a page box lands in the image built by cropping regions out of
+    the page and stacking them top to bottom, left-aligned (see
+    pdf_pages.crop_regions). Returns the box as fractions of that image.
+    Raises ValueError if no region holds the box.
+    """
+    width = max(right - left for left, _, right, _ in regions)
+    height = sum(bottom - top for _, top, _, bottom in regions)
+    y = 0.0
+    for left, top, right, bottom in regions:
+        if left <= box[0] and top <= box[1] and box[2] <= right and box[3] <= bottom:
+            return (
+                (box[0] - left) / width,
+                (y + box[1] - top) / height,
+                (box[2] - left) / width,
+                (y + box[3] - top) / height,
+            )
+        y += bottom - top
+    raise ValueError(f"No region holds the box {box}")